@@ -1,6 +1,6 @@
 import streamlit as st
-import PyPDF2
 import os
+from pdf_extraction import extract_pdf, read_preview
 
 st.set_page_config(page_title="PDF Collector")
 
@@ -17,19 +17,14 @@ book_texts = {}
 
 if uploaded_files:
     for file in uploaded_files:
-        pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ""
-        book_texts[file.name] = text
-        # Save to .txt file
-        txt_file_path = os.path.join(output_dir, file.name.replace(".pdf", ".txt"))
-        with open(txt_file_path, "w", encoding="utf-8") as f:
-            f.write(text)
+        # Extracts pages in parallel and streams them to the .txt file (cached by content hash)
+        extraction = extract_pdf(file.getvalue(), file.name, output_dir)
+        book_texts[file.name] = extraction.path
         st.subheader(f"File: {file.name}")
-        st.write(f"Extracted {len(text):,} characters.")
-        st.text_area("Preview:", value=text[:500], height=150)
+        st.write(f"Extracted {extraction.chars:,} characters from {extraction.pages:,} pages"
+                 + (" (cached)." if extraction.cached else "."))
+        st.text_area("Preview:", value=read_preview(extraction, 500), height=150)
         st.write("---")
 
-    st.success(f"Loaded {len(book_texts)} books into memory and saved as .txt files.")
+    st.success(f"Extracted {len(book_texts)} books and saved them as .txt files.")
     st.write("Books loaded and saved:", list(book_texts.keys()))
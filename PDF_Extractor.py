@@ -1,5 +1,5 @@
 import streamlit as st
-import PyPDF2
+from pdf_extraction import extract_pdf, read_preview
 
 st.title("PDF Text Extractor")
 
@@ -10,9 +10,6 @@ uploaded_files = st.file_uploader(
 if uploaded_files:
     for file in uploaded_files:
         st.subheader(f"Text from: {file.name}")
-        pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ""
-        st.text_area("Extracted Text", value=text[:5000], height=300)
+        extraction = extract_pdf(file.getvalue(), file.name)
+        st.text_area("Extracted Text", value=read_preview(extraction, 5000), height=300)
         # (Shows only first 5,000 chars for readability)
\ No newline at end of file
@@ -1,5 +1,5 @@
 import streamlit as st
-import PyPDF2
+from pdf_extraction import extract_pdf, read_preview
 
 st.set_page_config(page_title="PDF Multi-Uploader")
 
@@ -11,9 +11,6 @@ uploaded_files = st.file_uploader("Choose one or more PDF files", accept_multipl
 if uploaded_files:
     for file in uploaded_files:
         st.subheader(f"File: {file.name}")
-        pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ""
-        st.text_area("Extracted text (first 1000 chars):", value=text[:1000], height=200)
+        extraction = extract_pdf(file.getvalue(), file.name)
+        st.text_area("Extracted text (first 1000 chars):", value=read_preview(extraction, 1000), height=200)
         st.write("---")
@@ -1,13 +1,10 @@
 import streamlit as st
-import PyPDF2
+from pdf_extraction import extract_pdf, read_preview
 
 st.title("PDF Upload Test")
 
 uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
 if uploaded_file is not None:
-    pdf_reader = PyPDF2.PdfReader(uploaded_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() or ""
+    extraction = extract_pdf(uploaded_file.getvalue(), uploaded_file.name)
     st.write("Extracted Text (first 1000 characters):")
-    st.write(text[:1000])  # Show only first 1000 chars for test
+    st.write(read_preview(extraction, 1000))  # Show only first 1000 chars for test
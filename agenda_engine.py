@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+# ─── Meeting scripts ──────────────────────────────────────────────────────────
+# Both script formats compile to one Agenda, a sequence of typed steps that the
+# apps walk with a step index:
+#   <meeting>.json  [{"title": ..., "prompt": ...}, ...]; one AGENDA step each
+#   <meeting>.txt   one step per non-empty line:
+#                     "Step 2: Introductions"   HEADING
+#                     "ENTER_TEAM_MEMBERS"      MEMBERS (the member entry form)
+#                     "Team name:"              INPUT; "How many?:int" asks for a number
+#                     anything else             TEXT
+# Compiled agendas and directory listings are kept per process, shared by
+# every session, and re-read only when the file's (or directory's) mtime
+# changes, so a Streamlit rerun only stats the file.
+SCRIPTS_DIR = "meeting_scripts"
+FORMATS = (".json", ".txt")
+
+AGENDA = "agenda"
+HEADING = "heading"
+MEMBERS = "members"
+INPUT = "input"
+TEXT = "text"
+INPUT_TYPES = ("int",)
+
+_agendas: dict[str, tuple[int, "Agenda"]] = {}  # path -> (mtime, agenda)
+_listings: dict[tuple[str, tuple[str, ...]], tuple[int, list[str]]] = {}
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Step:
+    kind: str
+    title: str = ""
+    prompt: str = ""  # the step's text; the field label of an INPUT
+    input_type: str | None = None
+
+
+@dataclass(frozen=True)
+class Agenda:
+    name: str
+    path: str
+    steps: tuple[Step, ...]
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getitem__(self, index: int) -> Step:
+        return self.steps[index]
+
+    def __iter__(self):
+        return iter(self.steps)
+
+
+def _compile_line(line: str) -> Step:
+    if line.startswith("ENTER_TEAM_MEMBERS"):
+        return Step(MEMBERS)
+    if line.lower().startswith("step"):
+        return Step(HEADING, title=line)
+    label, _, kind = line.rpartition(":")
+    if label and kind in INPUT_TYPES:
+        return Step(INPUT, prompt=label, input_type=kind)
+    if line.endswith(":"):
+        return Step(INPUT, prompt=line)
+    return Step(TEXT, prompt=line)
+
+
+def parse_script(path: str) -> Agenda:
+    """Parse a .json or .txt meeting script into an Agenda."""
+    name, ext = os.path.splitext(os.path.basename(path))
+    with open(path, encoding="utf-8") as f:
+        if ext == ".json":
+            items = json.load(f)
+            if not isinstance(items, list) or not all(isinstance(i, dict) and "title" in i and "prompt" in i for i in items):
+                raise ValueError(f"{path}: expected a list of {{\"title\", \"prompt\"}} objects")
+            steps = tuple(Step(AGENDA, title=i["title"], prompt=i["prompt"]) for i in items)
+        elif ext == ".txt":
+            steps = tuple(_compile_line(line.strip()) for line in f if line.strip())
+        else:
+            raise ValueError(f"{path}: unknown script format {ext!r}; use one of {', '.join(FORMATS)}")
+    return Agenda(name, path, steps)
+
+
+def load_script(path: str) -> Agenda:
+    """The compiled script at path, recompiled only when the file has changed."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _agendas.get(path)
+    if cached is None or cached[0] != mtime:
+        agenda = parse_script(path)
+        with _lock:
+            _agendas[path] = cached = (mtime, agenda)
+    return cached[1]
+
+
+def list_scripts(directory: str = SCRIPTS_DIR, formats: tuple[str, ...] = FORMATS) -> list[str]:
+    """Sorted names of the meeting scripts in directory with one of formats."""
+    key = (directory, formats)
+    mtime = os.stat(directory).st_mtime_ns
+    cached = _listings.get(key)
+    if cached is None or cached[0] != mtime:
+        names = sorted({
+            os.path.splitext(f)[0] for f in os.listdir(directory)
+            if f.endswith(formats) and os.path.isfile(os.path.join(directory, f))
+        })
+        with _lock:
+            _listings[key] = cached = (mtime, names)
+    return cached[1]
+
+
+def load(name: str, directory: str = SCRIPTS_DIR, formats: tuple[str, ...] = FORMATS) -> Agenda | None:
+    """The compiled script of a meeting, in the first of formats it exists in; None if none."""
+    for ext in formats:
+        path = os.path.join(directory, name + ext)
+        try:
+            return load_script(path)
+        except FileNotFoundError:
+            continue
+    return None
@@ -0,0 +1,244 @@
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+# ─── Approximate nearest-neighbour indexes ────────────────────────────────────
+# ingest_books.py keeps every vector in an exact, ID-mapped flat index
+# (vectors.faiss) and derives the served index (index.faiss) from it with
+# build_index. The query-time knobs go to index_params.json, which
+# book_retrieval applies on load; FAISS_NPROBE / FAISS_EF_SEARCH override them.
+# The served index can store its vectors as float32, fp16, int8 (sq8) or PQ
+# codes, and is opened memory-mapped so every worker on a host shares one
+# page-cached copy.
+INDEX_TYPES = ("flat", "hnsw", "ivfflat", "ivfpq")
+STORAGE_TYPES = ("float32", "fp16", "sq8", "pq")
+PARAMS_NAME = "index_params.json"
+REPORT_NAME = "index_report.json"
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+EF_SEARCH = 64
+NPROBE = 16
+PQ_BITS = 8
+
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+# Older FAISS releases can only memory-map IVF lists, not flat codes
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def default_nlist(n: int) -> int:
+    """~4·√n lists, but keep ≥39 training points per list as FAISS recommends."""
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def default_pq_m(dim: int) -> int:
+    """Sub-quantizers for PQ storage: the largest of a few common sizes dividing dim."""
+    for m in (96, 64, 48, 32, 16, 8, 4, 2, 1):
+        if (dim % m == 0 and m <= dim // 4) or m == 1:
+            return m
+
+
+def export_vectors(exact: faiss.IndexIDMap2) -> tuple[np.ndarray, np.ndarray]:
+    """(ids, vectors) held by an ID-mapped flat index."""
+    ids = faiss.vector_to_array(exact.id_map).astype("int64")
+    vectors = exact.index.reconstruct_n(0, exact.ntotal)
+    return ids, vectors
+
+
+def _pq_bits(n: int) -> int:
+    # PQ needs a few points per centroid to train; shrink codebooks for tiny libraries
+    return PQ_BITS if n >= 39 * 2 ** PQ_BITS else max(1, min(PQ_BITS, int(np.log2(max(n // 39, 2)))))
+
+
+def storage_error(kind: str, storage: str) -> str | None:
+    """Why an index kind can't use a vector storage; None if it can."""
+    if kind == "ivfpq" and storage in _SQ_TYPES:
+        return "--index-type ivfpq stores PQ codes; use --storage pq or float32"
+    return None
+
+
+def build_index(
+    kind: str, vectors: np.ndarray, ids: np.ndarray, storage: str = "float32", **options
+) -> tuple[faiss.Index, dict]:
+    """Build an ID-mapped index of the given kind and vector storage; returns (index, search params)."""
+    n, dim = vectors.shape
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}; choose from {', '.join(STORAGE_TYPES)}")
+    error = storage_error(kind, storage)
+    if error:
+        raise ValueError(error)
+    if kind == "ivfpq":
+        storage = "pq"
+    elif kind == "ivfflat" and storage == "pq":
+        kind = "ivfpq"
+    params = {"type": kind, "storage": storage}
+    if storage == "pq":
+        params.update(pq_m=options.get("pq_m") or default_pq_m(dim), pq_bits=_pq_bits(n))
+    if kind == "flat":
+        if storage in _SQ_TYPES:
+            inner = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[storage], faiss.METRIC_L2)
+        elif storage == "pq":
+            inner = faiss.IndexPQ(dim, params["pq_m"], params["pq_bits"])
+        else:
+            inner = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        m = options.get("hnsw_m") or HNSW_M
+        if storage in _SQ_TYPES:
+            inner = faiss.IndexHNSWSQ(dim, _SQ_TYPES[storage], m)
+        elif storage == "pq":
+            inner = faiss.IndexHNSWPQ(dim, params["pq_m"], m, params["pq_bits"])
+        else:
+            inner = faiss.IndexHNSWFlat(dim, m)
+        inner.hnsw.efConstruction = options.get("ef_construction") or HNSW_EF_CONSTRUCTION
+        params["efSearch"] = options.get("ef_search") or EF_SEARCH
+    elif kind in ("ivfflat", "ivfpq"):
+        nlist = options.get("nlist") or default_nlist(n)
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivfpq":
+            inner = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_bits"])
+        elif storage in _SQ_TYPES:
+            inner = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _SQ_TYPES[storage], faiss.METRIC_L2)
+        else:
+            inner = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        params.update(nlist=nlist, nprobe=min(options.get("nprobe") or NPROBE, nlist))
+    else:
+        raise ValueError(f"Unknown index type {kind!r}; choose from {', '.join(INDEX_TYPES)}")
+    if not inner.is_trained:
+        inner.train(vectors)
+    index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(vectors, ids)
+    _set_search_params(index, params)
+    return index, params
+
+
+def read_index(path: str, mmap: bool = True) -> faiss.Index:
+    """Open a served index, memory-mapped (read-only) where this FAISS build supports it."""
+    if mmap:
+        try:
+            return faiss.read_index(path, MMAP_FLAGS)
+        except RuntimeError:
+            pass  # index types this FAISS build cannot map are read into memory
+    return faiss.read_index(path)
+
+
+def _set_search_params(index: faiss.Index, params: dict):
+    space = faiss.ParameterSpace()
+    if params.get("nprobe") and params.get("type") in ("ivfflat", "ivfpq"):
+        space.set_index_parameter(index, "nprobe", int(params["nprobe"]))
+    if params.get("efSearch") and params.get("type") == "hnsw":
+        space.set_index_parameter(index, "efSearch", int(params["efSearch"]))
+
+
+def apply_search_params(index: faiss.Index, params: dict):
+    """Set nprobe / efSearch on an index (through its ID map), honouring env overrides."""
+    params = dict(params)
+    if os.getenv("FAISS_NPROBE"):
+        params["nprobe"] = os.getenv("FAISS_NPROBE")
+    if os.getenv("FAISS_EF_SEARCH"):
+        params["efSearch"] = os.getenv("FAISS_EF_SEARCH")
+    _set_search_params(index, params)
+
+
+def load_search_params(directory: str) -> dict:
+    path = os.path.join(directory, PARAMS_NAME)
+    if not os.path.exists(path):
+        return {"type": "flat"}
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def _measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    """recall@k against exact results, and single-query latency in ms."""
+    latencies = []
+    found = []
+    for q in queries:
+        started = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append(ids[0])
+    hits = sum(len(set(f.tolist()) & set(t.tolist()) - {-1}) for f, t in zip(found, truth))
+    latencies = np.array(latencies)
+    return {
+        "recall": hits / truth.size,
+        "latency_ms_mean": float(latencies.mean()),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def recall_report(
+    index: faiss.Index,
+    params: dict,
+    exact: faiss.Index,
+    vectors: np.ndarray,
+    k: int = 10,
+    num_queries: int = 200,
+    seed: int = 0,
+) -> dict:
+    """Compare an index with the exact one over a sweep of its search parameters.
+
+    Queries are library vectors with a little noise added, so the exact top-k
+    is not just the query's own chunk.
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, 0.02, size=(len(picks), vectors.shape[1])).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(k, len(vectors))
+    _, truth = exact.search(queries, k)
+
+    report = {"type": params["type"], "k": k, "queries": len(queries), "ntotal": int(index.ntotal)}
+    report["exact"] = _measure(exact, queries, truth, k)
+    sweep = []
+    if params["type"] in ("ivfflat", "ivfpq"):
+        name, values = "nprobe", [v for v in (1, 2, 4, 8, 16, 32, 64, 128) if v <= params["nlist"]]
+    elif params["type"] == "hnsw":
+        name, values = "efSearch", [16, 32, 64, 128, 256]
+    else:
+        name, values = None, []
+    for value in values:
+        _set_search_params(index, {**params, name: value})
+        sweep.append({name: value, **_measure(index, queries, truth, k)})
+    _set_search_params(index, params)
+    report["chosen"] = {key: params[key] for key in ("nprobe", "efSearch") if key in params}
+    report["chosen"].update(_measure(index, queries, truth, k))
+    report["sweep"] = sweep
+    # What the storage costs in memory, and in recall, against the float32 flat index
+    served_bytes = int(faiss.serialize_index(index).nbytes)
+    exact_bytes = int(faiss.serialize_index(exact).nbytes)
+    report["memory"] = {
+        "storage": params.get("storage", "float32"),
+        "bytes": served_bytes,
+        "float32_flat_bytes": exact_bytes,
+        "saved": 1 - served_bytes / exact_bytes,
+        "recall_lost": report["exact"]["recall"] - report["chosen"]["recall"],
+    }
+    return report
+
+
+def _size(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def print_report(report: dict):
+    print(f"ℹ️ {report['type']} index, recall@{report['k']} over {report['queries']} queries:")
+    rows = [("exact", report["exact"])]
+    for row in report["sweep"]:
+        (name, value), *_ = row.items()
+        rows.append((f"{name}={value}", row))
+    chosen = ", ".join(f"{key}={report['chosen'][key]}" for key in ("nprobe", "efSearch") if key in report["chosen"])
+    rows.append((f"chosen ({chosen})" if chosen else "chosen", report["chosen"]))
+    for label, row in rows:
+        print(f"   {label:<20} recall {row['recall']:.3f} · {row['latency_ms_mean']:.3f} ms mean · "
+              f"{row['latency_ms_p95']:.3f} ms p95")
+    memory = report.get("memory")
+    if memory:
+        print(f"ℹ️ {memory['storage']} storage: {_size(memory['bytes'])} vs "
+              f"{_size(memory['float32_flat_bytes'])} float32 flat ({memory['saved']:.0%} saved), "
+              f"recall@{report['k']} lost {memory['recall_lost']:.3f}")
@@ -0,0 +1,217 @@
+import argparse
+import base64
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# ─── Local stand-in for the OpenAI API ────────────────────────────────────────
+# Serves POST /v1/embeddings and POST /v1/chat/completions (streamed or not),
+# so ingest, retrieval and mentor turns can run without an API key:
+#   python benchmarks/fake_openai.py --port 8765 --latency-ms 80
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake streamlit run mentor_app.py
+# Embeddings are deterministic: the normalized sum of one fixed random vector
+# per word, so texts sharing words get similar vectors and results are
+# reproducible. Latency is simulated per request, per embedding input and
+# per streamed token.
+DIM = 1536
+REPLY = (
+    "Thank you for sharing that. Hmm… before you build more, who exactly has this problem, "
+    "how often, and what do they use today? Talk to ten of them this week and bring back "
+    "what surprised you. Would you like me to share a real-life story about this?"
+)
+
+
+class FakeOpenAI:
+    """Embedding and completion behaviour of the fake server."""
+
+    def __init__(
+        self,
+        dim: int = DIM,
+        latency_ms: float = 0.0,
+        per_input_ms: float = 0.0,
+        first_token_ms: float = 0.0,
+        token_ms: float = 0.0,
+        reply_words: int = 60,
+    ):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.per_input = per_input_ms / 1000
+        self.first_token = first_token_ms / 1000
+        self.token = token_ms / 1000
+        words = REPLY.split()
+        self.reply = [(words[i % len(words)] + " ") for i in range(reply_words)]
+        self._words: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.requests = {"embeddings": 0, "embedding_inputs": 0, "chat": 0}
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._words.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode("utf8")))
+            vector = rng.standard_normal(self.dim).astype("float32")
+            with self._lock:
+                self._words[word] = vector
+        return vector
+
+    def embed(self, text: str) -> np.ndarray:
+        words = text.lower().split() or [""]
+        vector = np.sum([self._word_vector(w) for w in words], axis=0)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def embeddings(self, inputs: list[str]) -> list[np.ndarray]:
+        with self._lock:
+            self.requests["embeddings"] += 1
+            self.requests["embedding_inputs"] += len(inputs)
+        time.sleep(self.latency + self.per_input * len(inputs))
+        return [self.embed(text) for text in inputs]
+
+    def completion_tokens(self):
+        with self._lock:
+            self.requests["chat"] += 1
+        time.sleep(self.latency + self.first_token)
+        for i, token in enumerate(self.reply):
+            if i:
+                time.sleep(self.token)
+            yield token
+
+
+def _handler(fake: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body are separate writes
+
+        def _send_json(self, obj: dict, status: int = 200):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path.endswith("/embeddings"):
+                self._embeddings(request)
+            elif path.endswith("/chat/completions"):
+                self._chat(request)
+            else:
+                self._send_json({"error": {"message": f"No route {self.path}"}}, 404)
+
+        def _embeddings(self, request: dict):
+            inputs = request["input"]
+            inputs = [inputs] if isinstance(inputs, str) else [str(i) for i in inputs]
+            as_base64 = request.get("encoding_format") == "base64"
+            data = []
+            for i, vector in enumerate(fake.embeddings(inputs)):
+                if as_base64:
+                    embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            tokens = sum(len(text.split()) for text in inputs)
+            self._send_json({
+                "object": "list",
+                "data": data,
+                "model": request.get("model", ""),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def _chat(self, request: dict):
+            model = request.get("model", "")
+            created = int(time.time())
+            if not request.get("stream"):
+                text = "".join(fake.completion_tokens()).strip()
+                self._send_json({
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(fake.reply), "total_tokens": len(fake.reply)},
+                })
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(delta: dict, finish: str | None = None):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            event({"role": "assistant", "content": ""})
+            for token in fake.completion_tokens():
+                event({"content": token})
+            event({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class FakeOpenAIServer:
+    """The fake API on a background thread; use as a context manager."""
+
+    def __init__(self, fake: FakeOpenAI | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.fake = fake or FakeOpenAI()
+        self._server = ThreadingHTTPServer((host, port), _handler(self.fake))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local fake of the OpenAI embeddings and chat API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=DIM, help="Embedding dimension")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every request")
+    parser.add_argument("--per-input-ms", type=float, default=0.0, help="Added per embedding input")
+    parser.add_argument("--first-token-ms", type=float, default=0.0, help="Added before the first chat token")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Between streamed chat tokens")
+    parser.add_argument("--reply-words", type=int, default=60)
+    args = parser.parse_args(argv)
+    fake = FakeOpenAI(args.dim, args.latency_ms, args.per_input_ms, args.first_token_ms, args.token_ms, args.reply_words)
+    with FakeOpenAIServer(fake, args.host, args.port) as server:
+        print(f"✅ Fake OpenAI API at {server.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from glob import glob
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep benchmark spans out of the app's metrics log; the registry still records them
+os.environ.setdefault("METRICS_LOG", "")
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+# The fake embeddings are not calibrated like ada-002's, so only MMR reranks them
+os.environ.setdefault("RERANK_MIN_SIMILARITY", "0")
+
+import book_retrieval  # noqa: E402
+import index_versions  # noqa: E402
+import ingest_books  # noqa: E402
+import metrics  # noqa: E402
+from chunk_store import ChunkStore  # noqa: E402
+from chunking import book_title  # noqa: E402
+from conversation_context import ConversationContext, message_tokens, summarize_with  # noqa: E402
+from fake_openai import FakeOpenAI, FakeOpenAIServer  # noqa: E402
+from query_cache import QueryEmbeddingCache  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+# ─── Offline benchmarks ───────────────────────────────────────────────────────
+# Runs against benchmarks/fake_openai.py, so no API key is needed:
+#   python benchmarks/run_benchmarks.py --sizes 500,2000 --teams 1,8,32
+# 1) ingest: chunks/s of a full ingest_books.py run per synthetic library size
+# 2) search: search_excerpts latency and recall@k per library size and mode;
+#    a query is a fragment of one chunk, and a hit means that chunk came back
+# 3) turns: mentor-turn latency (journal write and retrieval in parallel, then
+#    a streamed completion, as in mentor_app.py) with N teams at once
+# Results go to benchmarks/results/<time>_<commit>.json and are compared with
+# the previous results file, so regressions show up between versions.
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MODES = ("dense", "lexical", "hybrid")
+WORDS_PER_CHUNK = 190  # roughly what the default 256-token chunker produces
+CHUNKS_PER_BOOK = 100
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": "You are SAVI, a seasoned entrepreneurship mentor. Respond to the team's latest input, "
+    "give constructive feedback and ask a follow-up question.",
+}
+
+
+def _percentiles(values: list[float]) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+    return {f"p{round(q * 100)}_ms": round(metrics.quantile(values, q) * 1000, 2) for q in metrics.QUANTILES}
+
+
+def write_library(directory: str, chunks: int, seed: int = 0) -> int:
+    """Write synthetic books of about `chunks` chunks in total; returns the number of books."""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("aeioubcdfghklmnprstvz") for _ in range(rng.randint(3, 9))) for _ in range(4000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]  # Zipf-like word frequencies
+    os.makedirs(directory, exist_ok=True)
+    books = max(1, round(chunks / CHUNKS_PER_BOOK))
+    for b in range(books):
+        lines = []
+        words_left = WORDS_PER_CHUNK * chunks // books
+        chapter = 0
+        while words_left > 0:
+            if not lines or rng.random() < 0.02:
+                chapter += 1
+                lines += [f"Chapter {chapter}", ""]
+            sentences = []
+            for _ in range(rng.randint(3, 7)):
+                words = rng.choices(vocabulary, weights, k=rng.randint(8, 24))
+                sentences.append(" ".join(words).capitalize() + ".")
+                words_left -= len(words)
+            lines += [" ".join(sentences), ""]
+        with open(os.path.join(directory, f"Synthetic Book {b + 1:03d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return books
+
+
+def _use_library(out_dir: str):
+    # Point book_retrieval at another library, with a cold query cache
+    book_retrieval.DATA_DIR = out_dir
+    book_retrieval._library = None
+    book_retrieval._query_cache = QueryEmbeddingCache(max_entries=100_000)
+
+
+def _sample_queries(out_dir: str, count: int, seed: int) -> list[tuple[str, tuple[str, int]]]:
+    """(query, (book title, offset) of the chunk it was cut from) pairs."""
+    store = ChunkStore(index_versions.resolve(out_dir)[1])
+    rng = random.Random(seed)
+    ids = store.ids().tolist()
+    queries = []
+    for i in rng.sample(ids, min(count, len(ids))):
+        words = store.text(i).split()
+        start = rng.randint(0, max(0, len(words) - 12))
+        book, _, offset = store.source(i)
+        queries.append((" ".join(words[start : start + 12]), (book_title(book), offset)))
+    store.close()
+    return queries
+
+
+def bench_ingest(books_dir: str, out_dir: str, base_url: str, options: list[str]) -> dict:
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        ingest_books.main(["--books-dir", books_dir, "--out-dir", out_dir, "--base-url", base_url, *options])
+    elapsed = time.perf_counter() - started
+    with open(os.path.join(index_versions.resolve(out_dir)[1], ingest_books.MANIFEST_NAME), encoding="utf8") as f:
+        manifest = json.load(f)
+    chunks = sum(len(book["chunks"]) for book in manifest["books"].values())
+    return {"chunks": chunks, "seconds": round(elapsed, 3), "chunks_per_s": round(chunks / elapsed, 1)}
+
+
+def bench_search(out_dir: str, queries: list, top_k: int) -> dict:
+    results = {}
+    for mode in MODES:
+        _use_library(out_dir)
+        book_retrieval.search_excerpts("warm up", top_k, mode)
+        latencies, hits = [], 0
+        for query, source in queries:
+            started = time.perf_counter()
+            excerpts = book_retrieval.search_excerpts(query, top_k, mode)
+            latencies.append(time.perf_counter() - started)
+            hits += source in {(e.book, e.offset) for e in excerpts}
+        results[mode] = {**_percentiles(latencies), f"recall@{top_k}": round(hits / len(queries), 3)}
+    return results
+
+
+def _team(team: int, turns: int, queries: list, client, store: SessionStore, executor, budget: int) -> list[dict]:
+    context = ConversationContext(budget)
+    history = [SYSTEM_PROMPT]
+    session = f"bench{team}"
+    store.start_session(f"team{team}", session, "benchmark")
+    summarize = summarize_with(client)
+    samples = []
+    for turn in range(turns):
+        query = queries[(team * turns + turn) % len(queries)][0]
+        started = time.perf_counter()
+        message = {"role": "user", "content": query, "kind": "chat", "step": 0}
+        history.append(message)
+        write = executor.submit(store.append_message, f"team{team}", session, message)
+        retrieval = executor.submit(book_retrieval.search_excerpts, query)
+        try:
+            excerpts = book_retrieval.pack_excerpts(retrieval.result(timeout=4), query)
+        except Exception:
+            excerpts = []
+        context_msgs = [{"role": "system", "content": book_retrieval.format_excerpts(excerpts)}] if excerpts else []
+        messages = context.build(SYSTEM_PROMPT, history, 0, context_msgs, summarize)
+        stream = client.chat.completions.create(model="gpt-4o", messages=messages, stream=True)
+        first_token, parts = None, []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                first_token = first_token or time.perf_counter()
+                parts.append(chunk.choices[0].delta.content)
+        reply = {"role": "assistant", "content": "".join(parts), "kind": "chat", "step": 0}
+        history.append(reply)
+        write.result()
+        store.append_message(f"team{team}", session, reply)
+        samples.append({
+            "seconds": time.perf_counter() - started,
+            "first_token": (first_token or time.perf_counter()) - started,
+            "prompt_tokens": sum(map(message_tokens, messages)),
+        })
+    return samples
+
+
+def bench_turns(out_dir: str, queries: list, teams: int, turns: int, base_url: str, budget: int) -> dict:
+    from openai import OpenAI
+
+    _use_library(out_dir)
+    metrics.registry = metrics.Registry()
+    client = OpenAI(api_key="fake", base_url=base_url)
+    embedding_calls = book_retrieval.batch_stats()["embedding_calls"]
+    with tempfile.TemporaryDirectory() as journal, ThreadPoolExecutor(8) as executor:
+        store = SessionStore(journal)
+        with ThreadPoolExecutor(teams) as pool:
+            runs = [pool.submit(_team, t, turns, queries, client, store, executor, budget) for t in range(teams)]
+            samples = [s for run in runs for s in run.result()]
+    stages = {
+        row["stage"]: {k: round(v * 1000, 2) for k, v in zip(("p50_ms", "p95_ms", "p99_ms"), row["quantiles"].values())}
+        for row in metrics.registry.rows()
+        if not row["labels"] or row["stage"] == "retrieval"
+    }
+    return {
+        "turns": len(samples),
+        **_percentiles([s["seconds"] for s in samples]),
+        "first_token": _percentiles([s["first_token"] for s in samples]),
+        "prompt_tokens_mean": round(sum(s["prompt_tokens"] for s in samples) / len(samples), 1),
+        "embedding_calls": book_retrieval.batch_stats()["embedding_calls"] - embedding_calls,
+        "stages": stages,
+    }
+
+
+def _flatten(obj, prefix: str = "") -> dict:
+    if isinstance(obj, dict):
+        flat = {}
+        for key, value in obj.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    return {prefix: obj} if isinstance(obj, (int, float)) else {}
+
+
+def compare(previous: dict, current: dict):
+    """Print the change of every shared number between two results files."""
+    before, after = _flatten(previous["results"]), _flatten(current["results"])
+    print(f"\nCompared with {previous['commit']} ({previous['timestamp']}):")
+    for name in sorted(set(before) & set(after)):
+        if before[name]:
+            change = (after[name] - before[name]) / abs(before[name]) * 100
+            print(f"  {name:<52} {before[name]:>10} → {after[name]:>10} ({change:+.1f}%)")
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest, search and mentor turns against a fake OpenAI API.")
+    parser.add_argument("--sizes", default="500,2000", help="Library sizes in chunks, comma-separated")
+    parser.add_argument("--teams", default="1,8,32", help="Concurrent teams, comma-separated")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per team")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per library size")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=256, help="Ingest --batch-size")
+    parser.add_argument("--workers", type=int, default=4, help="Ingest --workers")
+    parser.add_argument("--index-type", default="flat", help="Ingest --index-type")
+    parser.add_argument("--storage", default="float32", help="Ingest --storage")
+    parser.add_argument("--budget", type=int, default=6000, help="CONTEXT_TOKEN_BUDGET of a turn")
+    parser.add_argument("--dim", type=int, default=1536, help="Fake embedding dimension")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake API latency per request")
+    parser.add_argument("--per-input-ms", type=float, default=0.2, help="Fake latency per embedding input")
+    parser.add_argument("--first-token-ms", type=float, default=250.0, help="Fake time to the first chat token")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="Fake time between chat tokens")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--no-save", action="store_true", help="Print results without saving them")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    teams = [int(t) for t in args.teams.split(",")]
+
+    ingest_options = [
+        "--batch-size", str(args.batch_size), "--workers", str(args.workers),
+        "--index-type", args.index_type, "--storage", args.storage,
+    ]
+    fake = FakeOpenAI(args.dim, args.latency_ms, args.per_input_ms, args.first_token_ms, args.token_ms)
+    results = {"ingest": {}, "search": {}, "turns": {}}
+    with FakeOpenAIServer(fake) as server, tempfile.TemporaryDirectory() as work:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        libraries = {}
+        for size in sizes:
+            books_dir, out_dir = os.path.join(work, f"books{size}"), os.path.join(work, f"index{size}")
+            write_library(books_dir, size)
+            results["ingest"][size] = ingest = bench_ingest(books_dir, out_dir, server.base_url, ingest_options)
+            print(f"ingest  {size:>6} chunks: {ingest['chunks']} chunks in {ingest['seconds']}s, {ingest['chunks_per_s']} chunks/s")
+            queries = libraries[size] = (out_dir, _sample_queries(out_dir, args.queries, seed=size))
+            results["search"][size] = search = bench_search(*queries, args.top_k)
+            for mode, row in search.items():
+                print(f"search  {size:>6} chunks {mode:<8} {row}")
+        out_dir, queries = libraries[max(sizes)]
+        for n in teams:
+            results["turns"][n] = turns = bench_turns(out_dir, queries, n, args.turns, server.base_url, args.budget)
+            print(f"turns   {n:>6} teams: p50 {turns['p50_ms']} ms, p95 {turns['p95_ms']} ms, "
+                  f"first token p50 {turns['first_token']['p50_ms']} ms")
+
+    current = {
+        "commit": _commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "results": results,
+    }
+    previous = sorted(glob(os.path.join(args.results_dir, "*.json")))
+    if previous:
+        with open(previous[-1], encoding="utf8") as f:
+            compare(json.loads(f.read()), json.loads(json.dumps(current)))
+    if not args.no_save:
+        os.makedirs(args.results_dir, exist_ok=True)
+        path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%dT%H%M%S}_{current['commit']}.json")
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(current, f, indent=2)
+        print(f"✅ Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
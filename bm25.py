@@ -0,0 +1,126 @@
+import json
+import math
+import os
+from collections import Counter
+
+import numpy as np
+
+from text_utils import words
+
+# ─── BM25 lexical index ───────────────────────────────────────────────────────
+# An inverted index over the same chunk ids as the FAISS index, stored as flat
+# arrays so it can be memory-mapped like the chunk store:
+#   bm25.json          vocabulary (term order = term id), corpus stats, k1, b
+#   bm25.offsets.npy   int64 (terms + 1): postings of term t are [offsets[t], offsets[t+1])
+#   bm25.docs.npy      int32 chunk id of each posting, ascending within a term
+#   bm25.tfs.npy       uint16 term frequency of each posting
+#   bm25.doclen.npy    int32 length in terms of every chunk id
+VOCAB_NAME = "bm25.json"
+ARRAY_NAMES = ("offsets", "docs", "tfs", "doclen")
+
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or our "
+    "she so than that the their them they this to was we were what when which who will with "
+    "you your".split()
+)
+
+
+def terms(text: str) -> list[str]:
+    return [w for w in words(text) if w not in STOPWORDS]
+
+
+def exists(directory: str) -> bool:
+    names = [VOCAB_NAME] + [f"bm25.{name}.npy" for name in ARRAY_NAMES]
+    return all(os.path.exists(os.path.join(directory, name)) for name in names)
+
+
+def build(store, directory: str) -> int:
+    """Index every live chunk of a ChunkStore; returns the vocabulary size."""
+    vocab: dict[str, int] = {}
+    term_ids, doc_ids, tfs = [], [], []
+    doclen = np.zeros(len(store), dtype="int32")
+    for chunk_id in store.ids().tolist():
+        counts = Counter(terms(store.text(chunk_id)))
+        doclen[chunk_id] = sum(counts.values())
+        if not counts:
+            continue
+        term_ids.append(np.fromiter((vocab.setdefault(t, len(vocab)) for t in counts), "int32", len(counts)))
+        tfs.append(np.fromiter(counts.values(), "int32", len(counts)))
+        doc_ids.append(np.full(len(counts), chunk_id, dtype="int32"))
+    term_ids = np.concatenate(term_ids) if term_ids else np.empty(0, "int32")
+    doc_ids = np.concatenate(doc_ids) if doc_ids else np.empty(0, "int32")
+    tfs = np.concatenate(tfs) if tfs else np.empty(0, "int32")
+    order = np.lexsort((doc_ids, term_ids))
+    offsets = np.zeros(len(vocab) + 1, dtype="int64")
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+
+    live = doclen[store.ids()] if len(store) else doclen
+    arrays = {
+        "offsets": offsets,
+        "docs": doc_ids[order],
+        "tfs": np.minimum(tfs[order], np.iinfo("uint16").max).astype("uint16"),
+        "doclen": doclen,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"bm25.{name}.tmp.npy"), array)
+    with open(os.path.join(directory, "bm25.tmp.json"), "w", encoding="utf8") as f:
+        json.dump({
+            "terms": list(vocab),
+            "num_docs": int(len(live)),
+            "avgdl": float(live.mean()) if len(live) else 0.0,
+            "k1": K1,
+            "b": B,
+        }, f)
+    for name in arrays:
+        os.replace(os.path.join(directory, f"bm25.{name}.tmp.npy"), os.path.join(directory, f"bm25.{name}.npy"))
+    os.replace(os.path.join(directory, "bm25.tmp.json"), os.path.join(directory, VOCAB_NAME))
+    return len(vocab)
+
+
+class BM25Index:
+    """Read-only, memory-mapped BM25 index."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, VOCAB_NAME), encoding="utf8") as f:
+            info = json.load(f)
+        self._term_ids = {term: i for i, term in enumerate(info["terms"])}
+        self.num_docs = info["num_docs"]
+        self.avgdl = info["avgdl"] or 1.0
+        self.k1 = info["k1"]
+        self.b = info["b"]
+        for name in ARRAY_NAMES:
+            setattr(self, f"_{name}", np.load(os.path.join(directory, f"bm25.{name}.npy"), mmap_mode="r"))
+
+    def idf(self, term: str) -> float:
+        """BM25 idf of a term (0 for unknown terms)."""
+        tid = self._term_ids.get(term)
+        if tid is None:
+            return 0.0
+        df = int(self._offsets[tid + 1] - self._offsets[tid])
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """Top (chunk id, score) pairs for the query, best first."""
+        query_terms = Counter(terms(query))
+        if not query_terms:
+            return []
+        acc = np.zeros(len(self._doclen), dtype="float32")
+        for term, weight in query_terms.items():
+            tid = self._term_ids.get(term)
+            if tid is None:
+                continue
+            start, end = self._offsets[tid], self._offsets[tid + 1]
+            docs = self._docs[start:end]
+            tf = self._tfs[start:end].astype("float32")
+            norm = self.k1 * (1 - self.b + self.b * self._doclen[docs] / self.avgdl)
+            acc[docs] += weight * self.idf(term) * tf * (self.k1 + 1) / (tf + norm)
+        hits = np.flatnonzero(acc)
+        if not len(hits):
+            return []
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-acc[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-acc[hits])]
+        return [(int(i), float(acc[i])) for i in hits]
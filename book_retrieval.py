@@ -1,7 +1,26 @@
 import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
 import numpy as np
 import faiss
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+import bm25
+import dedup
+import index_versions
+import metrics
+import rerank
+import resources
+from ann_index import apply_search_params, load_search_params, read_index
+from chunk_store import ChunkStore
+from chunking import book_title
+from query_cache import QueryEmbeddingCache, normalize_query
+from text_utils import count_tokens
 
 # ─── Data directory for FAISS artifacts ───────────────────────────────────────
 # On Render, set FAISS_DATA_DIR=/mnt/data/faiss_index
@@ -11,30 +30,459 @@ DATA_DIR = os.getenv(
     os.path.join(os.path.dirname(__file__), "faiss_index")
 )
 
-INDEX_PATH = os.path.join(DATA_DIR, "index.faiss")
-TEXTS_PATH = os.path.join(DATA_DIR, "texts.npy")
+EMBED_MODEL = "text-embedding-ada-002"
+
+# ─── Retrieval modes ──────────────────────────────────────────────────────────
+# dense:   embed the query remotely, then search FAISS
+# lexical: BM25 over the same chunks, fully local
+# hybrid:  both, merged with reciprocal rank fusion
+# Whenever the embeddings call fails or takes longer than EMBED_TIMEOUT seconds,
+# dense and hybrid searches fall back to the lexical results.
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "5"))
+RRF_K = 60
+# Excerpts whose shingle Jaccard similarity with a better-ranked one reaches
+# DIVERSITY_THRESHOLD are skipped.
+DIVERSITY_THRESHOLD = float(os.getenv("DIVERSITY_THRESHOLD", "0.5"))
+
+# ─── Reranking ────────────────────────────────────────────────────────────────
+# top_k × RERANK_OVERFETCH candidates are retrieved (in hybrid mode, that many
+# from each ranking, fused down to that many). When the query has an embedding,
+# each candidate is scored by cosine similarity with its exact vector
+# (vectors.faiss, so quantized indexes rerank exactly too): those below
+# RERANK_MIN_SIMILARITY are dropped, possibly all of them, and the rest are
+# ordered by MMR (rerank.py) with RERANK_MMR_LAMBDA, taking hybrid relevance
+# from the rank fusion. Lexical results keep their BM25 order.
+RERANK_OVERFETCH = 4
+RERANK_MIN_SIMILARITY = float(os.getenv("RERANK_MIN_SIMILARITY", "0.75"))
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", str(rerank.MMR_LAMBDA)))
+# pack_excerpts trims each excerpt to its most relevant sentences, at most
+# EXCERPT_MAX_TOKENS, and keeps excerpts in rank order while they fit in
+# EXCERPT_TOKEN_BUDGET prompt tokens.
+EXCERPT_TOKEN_BUDGET = int(os.getenv("EXCERPT_TOKEN_BUDGET", "450"))
+EXCERPT_MAX_TOKENS = int(os.getenv("EXCERPT_MAX_TOKENS", "150"))
+MIN_EXCERPT_TOKENS = 30  # smaller leftovers of the budget are not worth an excerpt
+
+_EMBEDDING_UNAVAILABLE = (APIConnectionError, InternalServerError, RateLimitError, TimeoutError)
+
+# Query embeddings are cached in memory; set QUERY_CACHE_PATH to also keep
+# them in a SQLite file shared by every worker and kept across restarts.
+_query_cache = QueryEmbeddingCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    path=os.getenv("QUERY_CACHE_PATH"),
+    max_disk_entries=int(os.getenv("QUERY_CACHE_DISK_SIZE", "100000")),
+)
+
+# ─── Hot-swappable library ────────────────────────────────────────────────────
+# Every published build is loaded as one _Library. Queries take a single
+# reference to it, so an index is never paired with another build's chunks.
+# At most every VERSION_CHECK_INTERVAL seconds a query checks CURRENT; a new
+# version is loaded on a background thread and swapped in once ready, while
+# queries keep using the old one.
+VERSION_CHECK_INTERVAL = float(os.getenv("VERSION_CHECK_INTERVAL", "10"))
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") != "0"
 
-_index = None
-_texts = None
+_library = None
 _client = None
+_load_lock = threading.Lock()
+_swap_lock = threading.Lock()
+_swap_thread = None
+_next_check = 0.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _Library:
+    version: str | None
+    index: faiss.Index
+    store: ChunkStore
+    bm25: bm25.BM25Index | None
+    vectors: faiss.Index | None  # exact vectors by chunk id, for reranking
+
+
+def _open_library(version: str | None, directory: str) -> _Library:
+    # Memory-map the FAISS indexes, chunk store and BM25 index, so every worker
+    # on the host shares one page-cached copy
+    index = read_index(os.path.join(directory, "index.faiss"), mmap=FAISS_MMAP)
+    params = load_search_params(directory)
+    apply_search_params(index, params)
+    lexical = bm25.BM25Index(directory) if bm25.exists(directory) else None
+    vectors_path = os.path.join(directory, "vectors.faiss")
+    if params["type"] == "flat" and params.get("storage", "float32") == "float32":
+        vectors = index
+    elif os.path.exists(vectors_path):
+        vectors = read_index(vectors_path, mmap=FAISS_MMAP)
+    else:
+        vectors = None
+    return _Library(version, index, ChunkStore(directory), lexical, vectors)
+
+
+def _swap_in(version: str, directory: str):
+    global _library, _swap_thread
+    try:
+        _library = _open_library(version, directory)
+        logger.info("Switched book library to version %s", version)
+    except Exception as err:
+        logger.warning("Could not load library version %s: %s", version, err)
+    finally:
+        _swap_thread = None
+
+
+def _check_for_new_version():
+    global _next_check, _swap_thread
+    now = time.monotonic()
+    if now < _next_check:
+        return
+    _next_check = now + VERSION_CHECK_INTERVAL
+    version, directory = index_versions.resolve(DATA_DIR)
+    if version is None or version == _library.version:
+        return
+    with _swap_lock:
+        if _swap_thread is None:
+            _swap_thread = threading.Thread(target=_swap_in, args=(version, directory), daemon=True)
+            _swap_thread.start()
+
+
+def current_version() -> str | None:
+    """Version of the library this process is serving (None before the first query)."""
+    return _library.version if _library is not None else None
+
+
+def served_version() -> str | None:
+    """Version of the library this process is serving, loading it if not loaded yet."""
+    return _load_library().version
+
+
+# ─── Cross-session query batching ─────────────────────────────────────────────
+# Every Streamlit session searches on its own thread. Dense lookups all go
+# through one shared batcher: it collects the queries arriving within
+# EMBED_BATCH_WINDOW_MS (up to EMBED_BATCH_SIZE), embeds the uncached ones in a
+# single embeddings call and runs one index.search per index for the group.
+# At most EMBED_BATCH_WORKERS batches are in flight; while they are, new
+# queries queue up and form the next, larger batch. Queries already in the
+# query cache skip the batcher and search the index directly.
+EMBED_BATCH_WINDOW = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_WORKERS = int(os.getenv("EMBED_BATCH_WORKERS", "4"))
+
+
+@dataclass
+class _DenseRequest:
+    query: str
+    k: int
+    index: faiss.Index
+    client: OpenAI
+    future: Future = field(default_factory=Future)
+
+
+class _QueryBatcher:
+    def __init__(self, window: float, max_batch: int, workers: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="query-batch")
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.embedding_calls = 0
+
+    def search(self, query: str, k: int, index: faiss.Index, client: OpenAI) -> tuple[np.ndarray, list[int]]:
+        """The query's embedding and the FAISS ids of its k nearest chunks.
+
+        Raises TimeoutError after EMBED_TIMEOUT seconds.
+        """
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name="query-batcher", daemon=True)
+                    self._thread.start()
+        request = _DenseRequest(query, k, index, client)
+        self._queue.put(request)
+        return request.future.result(timeout=EMBED_TIMEOUT)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"batches": self.batches, "queries": self.queries, "embedding_calls": self.embedding_calls}
+
+    def _collect(self):
+        while True:
+            self._slots.acquire()
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: list[_DenseRequest]):
+        try:
+            with metrics.span("dense_batch") as span:
+                self._search(batch, span)
+        except BaseException as err:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(err)
+        finally:
+            self._slots.release()
+
+    def _search(self, batch: list[_DenseRequest], span: metrics.Span):
+        # 1) One embeddings call for every distinct uncached query
+        vectors: dict[str, np.ndarray | None] = {}
+        missing: list[str] = []
+        for request in batch:
+            key = normalize_query(request.query)
+            if key not in vectors:
+                vectors[key] = _query_cache.get(EMBED_MODEL, request.query)
+                if vectors[key] is None:
+                    missing.append(request.query)
+        span.add(queries=len(batch), cache_hits=len(vectors) - len(missing), cache_misses=len(missing))
+        if missing:
+            with metrics.span("embedding", model=EMBED_MODEL) as embedding:
+                embedding.add(inputs=len(missing))
+                resp = batch[0].client.embeddings.create(model=EMBED_MODEL, input=missing)
+            for item in resp.data:
+                vector = np.array(item.embedding, dtype="float32")
+                vectors[normalize_query(missing[item.index])] = vector
+                _query_cache.put(EMBED_MODEL, missing[item.index], vector)
+
+        # 2) One search per index (a version swap can put two in one batch)
+        groups: dict[int, list[_DenseRequest]] = {}
+        for request in batch:
+            groups.setdefault(id(request.index), []).append(request)
+        for requests in groups.values():
+            keys = list(dict.fromkeys(normalize_query(r.query) for r in requests))
+            with metrics.span("faiss_search") as search:
+                search.add(queries=len(keys))
+                _, indices = requests[0].index.search(np.stack([vectors[key] for key in keys]), max(r.k for r in requests))
+            rows = dict(zip(keys, indices.tolist()))
+            for request in requests:
+                key = normalize_query(request.query)
+                request.future.set_result((vectors[key], [i for i in rows[key][: request.k] if i != -1]))
+
+        with self._stats_lock:
+            self.batches += 1
+            self.queries += len(batch)
+            self.embedding_calls += bool(missing)
+
+
+_batcher = _QueryBatcher(EMBED_BATCH_WINDOW, EMBED_BATCH_SIZE, EMBED_BATCH_WORKERS)
 
-def _load_resources():
-    global _index, _texts, _client
-    if _index is None or _texts is None:
-        # Load both the FAISS index and the texts array from DATA_DIR
-        _index = faiss.read_index(INDEX_PATH)
-        _texts = np.load(TEXTS_PATH, allow_pickle=True)
+
+@dataclass(frozen=True)
+class Excerpt:
+    text: str
+    book: str = ""  # readable book title
+    chapter: str = ""
+    offset: int = 0  # character offset in the extracted book
+
+    @property
+    def source(self) -> str:
+        return " — ".join(part for part in (self.book, self.chapter) if part)
+
+
+def _load_library() -> _Library:
+    global _library
+    if _library is None:
+        with _load_lock:
+            if _library is None:
+                _library = _open_library(*index_versions.resolve(DATA_DIR))
+    else:
+        _check_for_new_version()
+    return _library
+
+
+def _load_resources() -> tuple[_Library, OpenAI]:
+    global _client
+    library = _load_library()
     if _client is None:
-        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    return _index, _texts, _client
+        # A view of the process's shared client, with the embedding timeout
+        _client = resources.openai_client(timeout=EMBED_TIMEOUT, max_retries=1)
+    return library, _client
 
 
-def search_books(query: str, top_k: int = 3) -> list[str]:
-    """Return top book excerpts relevant to the query."""
-    index, texts, client = _load_resources()
-    resp = client.embeddings.create(model="text-embedding-ada-002", input=query)
-    vector = np.array(resp.data[0].embedding, dtype="float32").reshape(1, -1)
-    distances, indices = index.search(vector, top_k)
-    # Collect results and return
-    results = [texts[i] for i in indices[0] if i != -1]
+def warm_up() -> str | None:
+    """Load the served library and read its files once, so the first query hits the page cache.
+
+    Returns the loaded version.
+    """
+    library = _load_library()
+    _, directory = index_versions.resolve(DATA_DIR)
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                while f.read(1 << 23):
+                    pass
+    return library.version
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the query-embedding cache."""
+    return _query_cache.stats()
+
+
+def batch_stats() -> dict:
+    """How many dense lookups were batched into how many batches and embeddings calls."""
+    return _batcher.stats()
+
+
+def _dense_search(query: str, k: int, index, client: OpenAI) -> tuple[np.ndarray, list[int]]:
+    # A cached query searches right away; only misses wait for a batch and its embeddings call
+    vector = _query_cache.get(EMBED_MODEL, query)
+    if vector is None:
+        return _batcher.search(query, k, index, client)
+    with metrics.span("faiss_search") as search:
+        search.add(queries=1, cache_hits=1)
+        _, indices = index.search(vector.reshape(1, -1), k)
+    return vector, [i for i in indices[0].tolist() if i != -1]
+
+
+def _lexical_ids(query: str, k: int, library: _Library) -> list[int]:
+    with metrics.span("bm25_search"):
+        return [i for i, _ in library.bm25.search(query, k)]
+
+
+def _fusion_scores(rankings: list[list[int]]) -> dict[int, float]:
+    """Reciprocal rank fusion: score(id) = Σ 1 / (RRF_K + rank)."""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking, start=1):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (RRF_K + rank)
+    return scores
+
+
+def _fuse(rankings: list[list[int]], k: int) -> list[int]:
+    scores = _fusion_scores(rankings)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def search_excerpts(query: str, top_k: int = 3, mode: str | None = None) -> list[Excerpt]:
+    """Return top book excerpts relevant to the query, with their sources.
+
+    mode is "dense", "lexical" or "hybrid" (default: RETRIEVAL_MODE). Without a
+    BM25 index every mode searches dense.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; choose from {', '.join(RETRIEVAL_MODES)}")
+    with metrics.span("retrieval", mode=mode) as span:
+        return _retrieve(query, top_k, mode, span)
+
+
+def _retrieve(query: str, top_k: int, mode: str, span: metrics.Span) -> list[Excerpt]:
+    library, client = _load_resources()
+    if library.bm25 is None:
+        mode = "dense"
+    wanted = top_k * RERANK_OVERFETCH
+    rankings = []
+    query_vector = None
+    if mode in ("lexical", "hybrid"):
+        rankings.append(_lexical_ids(query, wanted, library))
+    if mode in ("dense", "hybrid"):
+        try:
+            query_vector, ids = _dense_search(query, wanted, library.index, client)
+            rankings.append(ids)
+        except _EMBEDDING_UNAVAILABLE as err:
+            if library.bm25 is None:
+                raise
+            logger.warning("Query embedding failed (%s); using lexical retrieval", str(err) or type(err).__name__)
+            span.add(lexical_fallbacks=1)
+            if mode == "dense":
+                rankings.append(_lexical_ids(query, wanted, library))
+    ids = rankings[0][:wanted] if len(rankings) == 1 else _fuse(rankings, wanted)
+
+    # The store is indexed by FAISS id; removed ids have no text
+    store = library.store
+    texts = {i: text for i in ids if (text := store.text(i)) is not None}
+    ids = [i for i in ids if i in texts]
+    if query_vector is not None and library.vectors is not None and ids:
+        # Hybrid candidates keep their fused score as relevance, so BM25 still counts
+        fused = _fusion_scores(rankings) if len(rankings) > 1 else None
+        ids = _rerank(query_vector, ids, library.vectors, span, fused)
+
+    results = []
+    for i in ids:
+        text = texts[i]
+        if any(dedup.jaccard(text, chosen.text) >= DIVERSITY_THRESHOLD for chosen in results):
+            span.add(near_duplicates=1)
+            continue
+        book, chapter, offset = store.source(i)
+        results.append(Excerpt(text, book_title(book), chapter, offset))
+        if len(results) == top_k:
+            break
     return results
+
+
+def _rerank(
+    query_vector: np.ndarray,
+    ids: list[int],
+    vectors: faiss.Index,
+    span: metrics.Span,
+    fused: dict[int, float] | None = None,
+) -> list[int]:
+    """Candidates at or above RERANK_MIN_SIMILARITY, in MMR order.
+
+    Relevance is the cosine similarity, or the fused score scaled to [0, 1] when given.
+    """
+    with metrics.span("rerank") as rerank_span:
+        rerank_span.add(candidates=len(ids))
+        try:
+            matrix = np.stack([vectors.reconstruct(int(i)) for i in ids])
+        except RuntimeError as err:  # e.g. a build whose exact vectors miss some chunk
+            logger.warning("Could not rerank excerpts: %s", err)
+            return ids
+        similarity = rerank.cosine(query_vector, matrix)
+        relevant = np.flatnonzero(similarity >= RERANK_MIN_SIMILARITY)
+        span.add(below_threshold=len(ids) - len(relevant))
+        if not len(relevant):
+            span.add(no_relevant_excerpts=1)
+            return []
+        relevance = similarity[relevant]
+        if fused:
+            relevance = np.array([fused[ids[n]] for n in relevant]) / max(fused.values())
+        order = rerank.mmr(relevance, matrix[relevant], RERANK_MMR_LAMBDA)
+        return [ids[relevant[n]] for n in order]
+
+
+def search_books(query: str, top_k: int = 3, mode: str | None = None) -> list[str]:
+    """Return top book excerpts relevant to the query."""
+    return [excerpt.text for excerpt in search_excerpts(query, top_k, mode)]
+
+
+def pack_excerpts(
+    excerpts: list[Excerpt],
+    query: str,
+    budget: int = EXCERPT_TOKEN_BUDGET,
+    max_tokens: int = EXCERPT_MAX_TOKENS,
+) -> list[Excerpt]:
+    """Excerpts trimmed to their sentences most relevant to query, in order, within budget tokens."""
+    with metrics.span("excerpt_pack") as span:
+        packed, left = [], budget
+        for excerpt in excerpts:
+            header = count_tokens(f"[{excerpt.source}]\n---\n") if excerpt.source else count_tokens("\n---\n")
+            room = min(max_tokens, left - header)
+            if room < MIN_EXCERPT_TOKENS:
+                break
+            text = rerank.trim(excerpt.text, query, room)
+            if not text:
+                continue
+            packed.append(replace(excerpt, text=text))
+            left -= header + count_tokens(text)
+            span.add(tokens_in=count_tokens(excerpt.text), tokens_out=count_tokens(text))
+        span.add(excerpts_in=len(excerpts), excerpts_out=len(packed))
+        return packed
+
+
+def format_excerpts(excerpts: list[Excerpt]) -> str:
+    """Render excerpts for a system message, each headed by its source."""
+    return "\n---\n".join(
+        f"[{excerpt.source}]\n{excerpt.text}" if excerpt.source else excerpt.text
+        for excerpt in excerpts
+    )
@@ -0,0 +1,121 @@
+import json
+import mmap
+import os
+
+import numpy as np
+
+# ─── On-disk chunk store ──────────────────────────────────────────────────────
+# chunks.bin         every chunk's UTF-8 text, back to back
+# chunks.spans.npy   int64 (n, 2): [start, end) byte range of chunk id i in chunks.bin
+# chunks.meta.npy    per id: book and chapter (indices into chunks.json) and offset
+# chunks.json        the book and chapter name tables
+#
+# Ids are FAISS ids. Removed ids keep an empty span and book = -1. All three
+# arrays are opened with mmap, so every process reading the store shares the
+# OS page cache instead of holding its own copy of the library.
+BLOB_NAME = "chunks.bin"
+SPANS_NAME = "chunks.spans.npy"
+META_NAME = "chunks.meta.npy"
+NAMES_NAME = "chunks.json"
+
+META_DTYPE = np.dtype([("book", "<i4"), ("chapter", "<i4"), ("offset", "<i8")])
+
+
+def exists(directory: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(directory, name))
+        for name in (BLOB_NAME, SPANS_NAME, META_NAME, NAMES_NAME)
+    )
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._spans = np.load(os.path.join(directory, SPANS_NAME), mmap_mode="r")
+        self._meta = np.load(os.path.join(directory, META_NAME), mmap_mode="r")
+        with open(os.path.join(directory, NAMES_NAME), encoding="utf8") as f:
+            names = json.load(f)
+        self._books = names["books"]
+        self._chapters = names["chapters"]
+        with open(os.path.join(directory, BLOB_NAME), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        """One past the highest id (removed ids included)."""
+        return len(self._spans)
+
+    def text(self, chunk_id: int) -> str | None:
+        if not 0 <= chunk_id < len(self._spans) or self._meta[chunk_id]["book"] < 0:
+            return None
+        start, end = self._spans[chunk_id]
+        return self._blob[start:end].decode("utf8")
+
+    def source(self, chunk_id: int) -> tuple[str, str, int] | None:
+        """(book file name, chapter, character offset) of a chunk."""
+        if not 0 <= chunk_id < len(self._meta):
+            return None
+        book, chapter, offset = self._meta[chunk_id].tolist()
+        if book < 0:
+            return None
+        return self._books[book], self._chapters[chapter], offset
+
+    def ids(self):
+        """Live chunk ids, in id order."""
+        return np.flatnonzero(self._meta["book"] >= 0)
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+
+
+class ChunkStoreWriter:
+    """Write a new chunk store next to (or over) an existing one.
+
+    Chunks may be added in any id order. Files are written under temporary
+    names and renamed into place by close(), so readers of the old store are
+    never handed a half-written one.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._blob = open(self._tmp(BLOB_NAME), "wb")
+        self._written = 0
+        self._spans: dict[int, tuple[int, int]] = {}
+        self._meta: dict[int, tuple[int, int, int]] = {}
+        self._books: dict[str, int] = {}
+        self._chapters: dict[str, int] = {}
+
+    def _tmp(self, name: str) -> str:
+        root, ext = os.path.splitext(name)
+        return os.path.join(self.directory, f"{root}.tmp{ext}")
+
+    def add(self, chunk_id: int, text: str, book: str, chapter: str, offset: int):
+        data = text.encode("utf8")
+        self._blob.write(data)
+        self._spans[chunk_id] = (self._written, self._written + len(data))
+        self._written += len(data)
+        book_idx = self._books.setdefault(book, len(self._books))
+        chapter_idx = self._chapters.setdefault(chapter, len(self._chapters))
+        self._meta[chunk_id] = (book_idx, chapter_idx, offset)
+
+    def close(self, size: int | None = None):
+        """Finish the store; size is the number of ids (defaults to max id + 1)."""
+        self._blob.close()
+        if size is None:
+            size = max(self._spans, default=-1) + 1
+        spans = np.zeros((size, 2), dtype="<i8")
+        meta = np.zeros(size, dtype=META_DTYPE)
+        meta["book"] = -1
+        for chunk_id, span in self._spans.items():
+            spans[chunk_id] = span
+            meta[chunk_id] = self._meta[chunk_id]
+        np.save(self._tmp(SPANS_NAME), spans)
+        np.save(self._tmp(META_NAME), meta)
+        with open(self._tmp(NAMES_NAME), "w", encoding="utf8") as f:
+            json.dump({"books": list(self._books), "chapters": list(self._chapters)}, f)
+        for name in (BLOB_NAME, SPANS_NAME, META_NAME, NAMES_NAME):
+            os.replace(self._tmp(name), os.path.join(self.directory, name))
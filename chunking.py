@@ -0,0 +1,138 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from text_utils import count_tokens, split_sentences
+
+MAX_TOKENS = 256  # token budget per chunk (~1 000 characters)
+OVERLAP_TOKENS = 32  # trailing context repeated at the start of the next chunk
+
+_CHAPTER = re.compile(
+    r"^\s*(chapter|part|section)\s+([0-9]+|[ivxlc]+|one|two|three|four|five|six|seven|eight|nine|ten)\b",
+    re.IGNORECASE,
+)
+_LEADER = re.compile(r"(\.\s*){4,}")  # table-of-contents dot leaders
+_TERMINAL = re.compile(r"[.!?…][\"'”’)\]]*\s*$")
+_MAX_PENDING = 16_000  # characters; give up waiting for a sentence end
+
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    book: str  # file name under extracted_books/
+    chapter: str  # nearest preceding chapter heading, or ""
+    offset: int  # character offset of the chunk's first sentence in the book
+    text: str
+
+
+def _sentences(path: str) -> Iterator[tuple[int, str, str, bool]]:
+    """Yield (offset, sentence, chapter, ends_paragraph), reading one line at a time.
+
+    PDF extracts wrap sentences across lines, so an unfinished sentence is
+    carried into the next line instead of being cut at the line break.
+    """
+    chapter = ""
+    pending, pending_at = "", 0
+    offset = 0
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            line_at, offset = offset, offset + len(line)
+            if len(line) <= 60 and _CHAPTER.match(line) and not _LEADER.search(line) and not _TERMINAL.search(line):
+                if pending.strip():
+                    yield pending_at, pending, chapter, True
+                pending = ""
+                chapter = " ".join(line.split())
+            if not pending:
+                pending_at = line_at
+            pending += line
+            blank = not line.strip()
+            sentences = split_sentences(pending)
+            if not sentences:
+                pending = ""
+                continue
+            last_at, last = sentences[-1]
+            complete = blank or _TERMINAL.search(last) or len(last) > _MAX_PENDING
+            if not complete:
+                sentences = sentences[:-1]
+            for i, (at, sentence) in enumerate(sentences):
+                ends_paragraph = complete and i == len(sentences) - 1 and line.endswith("\n")
+                yield pending_at + at, sentence, chapter, ends_paragraph
+            if complete:
+                pending = ""
+            else:
+                pending, pending_at = last, pending_at + last_at
+    if pending.strip():
+        yield pending_at, pending, chapter, True
+
+
+def _split_long(at: int, sentence: str, max_tokens: int) -> Iterator[tuple[int, str]]:
+    """Cut an over-long sentence (tables, run-on text) at whitespace."""
+    width = max_tokens * 4
+    while len(sentence) > width:
+        cut = sentence.rfind(" ", 0, width)
+        cut = cut if cut > 0 else width
+        yield at, sentence[:cut]
+        at, sentence = at + cut, sentence[cut:]
+    yield at, sentence
+
+
+def chunk_book(
+    path: str,
+    max_tokens: int = MAX_TOKENS,
+    overlap_tokens: int = OVERLAP_TOKENS,
+) -> Iterator[Chunk]:
+    """Stream one book as chunks of whole sentences within a token budget.
+
+    Chunks prefer to end at paragraph boundaries, never span a chapter heading,
+    and start with up to overlap_tokens of the previous chunk's last sentences.
+    """
+    book = os.path.basename(path)
+    current: list[tuple[int, str, int]] = []  # (offset, sentence, tokens)
+    tokens = 0
+    chapter = ""
+
+    def flush(keep_overlap: bool):
+        nonlocal current, tokens
+        text = "".join(s for _, s, _ in current).strip()
+        chunk = Chunk(book, chapter, current[0][0], text) if text else None
+        tail, tail_tokens = [], 0
+        if keep_overlap:
+            for item in reversed(current[1:]):
+                if tail_tokens + item[2] > overlap_tokens:
+                    break
+                tail.insert(0, item)
+                tail_tokens += item[2]
+        current, tokens = tail, tail_tokens
+        return chunk
+
+    for at, sentence, sentence_chapter, ends_paragraph in _sentences(path):
+        if sentence_chapter != chapter:
+            if current and (chunk := flush(keep_overlap=False)):
+                yield chunk
+            chapter = sentence_chapter
+        for piece_at, piece in _split_long(at, sentence, max_tokens):
+            n = count_tokens(piece)
+            if current and tokens + n > max_tokens:
+                if chunk := flush(keep_overlap=True):
+                    yield chunk
+                if tokens + n > max_tokens:
+                    current, tokens = [], 0
+            current.append((piece_at, piece, n))
+            tokens += n
+        if ends_paragraph and tokens >= 0.75 * max_tokens:
+            if chunk := flush(keep_overlap=True):
+                yield chunk
+    if current and (chunk := flush(keep_overlap=False)):
+        yield chunk
+
+
+def iter_chunks(paths: Iterable[str], **options) -> Iterator[Chunk]:
+    """Chunk several books lazily, one file open at a time."""
+    for path in paths:
+        yield from chunk_book(path, **options)
+
+
+def book_title(name: str) -> str:
+    """Readable title from a file name in extracted_books/."""
+    title = os.path.splitext(name)[0]
+    return re.sub(r"\s*\(Z-Library\)\s*$", "", title).strip()
@@ -0,0 +1,131 @@
+import logging
+
+from text_utils import count_tokens
+
+# ─── Token-budgeted conversation context ──────────────────────────────────────
+# History messages carry two extra keys besides role/content:
+#   kind: "agenda" (the step's scripted prompt), "boilerplate" (the app's own
+#         navigation prompts) or "chat" (everything else, the default)
+#   step: the agenda step the message belongs to
+# Boilerplate is never sent to the model. History is sent verbatim while it
+# fits the budget; once it does not, earlier steps are folded into a running
+# summary, and if the current step alone outgrows the budget its oldest
+# messages are folded too, so every request stays under the budget. Each fold
+# is a summary call made before the reply, so it happens only when needed.
+AGENDA = "agenda"
+BOILERPLATE = "boilerplate"
+CHAT = "chat"
+
+MESSAGE_OVERHEAD = 4  # tokens the chat format adds per message
+KEEP_RECENT = 4  # latest messages of the current step that are never folded
+SUMMARY_TIMEOUT = 10.0  # seconds; a fold that takes longer drops the messages instead
+
+SUMMARY_PROMPT = (
+    "You keep the running notes of an entrepreneurship mentoring session. "
+    "Update the notes with the new messages. Keep the team's members, problem, "
+    "solution, customers, decisions, commitments and open questions; drop "
+    "pleasantries. Reply with the updated notes only, in at most 200 words."
+)
+
+logger = logging.getLogger(__name__)
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def api_message(message: dict) -> dict:
+    """The message as the chat API expects it, without our bookkeeping keys."""
+    return {"role": message["role"], "content": message["content"]}
+
+
+def summarize_with(client, model: str = "gpt-4o-mini", timeout: float = SUMMARY_TIMEOUT):
+    """A summarize(previous_summary, messages) callable backed by a chat model."""
+
+    def summarize(previous: str, messages: list[dict]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current notes:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+            ],
+            temperature=0.2,
+            max_tokens=400,
+            timeout=timeout,
+        )
+        return resp.choices[0].message.content.strip()
+
+    return summarize
+
+
+class ConversationContext:
+    """Per-session state: the running summary and how much history it covers."""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.summary = ""
+        self.folded = 1  # history[1:folded] is covered by the summary; [0] is the system prompt
+
+    def _fold(self, history: list[dict], upto: int, summarize):
+        messages = [m for m in history[self.folded : upto] if m.get("kind", CHAT) != BOILERPLATE]
+        if messages:
+            try:
+                self.summary = summarize(self.summary, messages)
+            except Exception as err:  # the turn must go on; the messages are just dropped
+                logger.warning("Could not summarize %d messages: %s", len(messages), err)
+        self.folded = upto
+
+    def _assemble(
+        self,
+        system_prompt: dict,
+        history: list[dict],
+        step: int,
+        context_msgs: list[dict],
+        with_summary: bool = True,
+    ) -> list[dict]:
+        messages = [system_prompt]
+        if self.summary and with_summary:
+            messages.append({"role": "system", "content": "Notes from earlier in this meeting:\n" + self.summary})
+        messages += context_msgs
+        recent = history[self.folded :]
+        # The current step's agenda prompt stays verbatim even once folded
+        prompt = next(
+            (m for m in history[1 : self.folded] if m.get("kind") == AGENDA and m.get("step") == step), None
+        )
+        if prompt is not None:
+            messages.append(api_message(prompt))
+        messages += [api_message(m) for m in recent if m.get("kind", CHAT) != BOILERPLATE]
+        return messages
+
+    def build(
+        self,
+        system_prompt: dict,
+        history: list[dict],
+        step: int,
+        context_msgs: list[dict],
+        summarize,
+    ) -> list[dict]:
+        """Messages for the next completion, within budget tokens where at all possible."""
+        # 1) Over budget: fold every message from earlier agenda steps into the summary
+        messages = self._assemble(system_prompt, history, step, context_msgs)
+        first_current = next(
+            (i for i in range(self.folded, len(history)) if history[i].get("step", step) >= step), len(history)
+        )
+        if sum(map(message_tokens, messages)) > self.budget and first_current > self.folded:
+            self._fold(history, first_current, summarize)
+            messages = self._assemble(system_prompt, history, step, context_msgs)
+
+        # 2) Still over: fold the oldest half of the current step, keeping the latest messages
+        while sum(map(message_tokens, messages)) > self.budget and len(history) - self.folded > KEEP_RECENT:
+            foldable = len(history) - KEEP_RECENT - self.folded
+            self._fold(history, self.folded + max(1, foldable // 2), summarize)
+            messages = self._assemble(system_prompt, history, step, context_msgs)
+
+        # 3) Still over: drop book excerpts, then the summary
+        while sum(map(message_tokens, messages)) > self.budget and context_msgs:
+            context_msgs = context_msgs[:-1]
+            messages = self._assemble(system_prompt, history, step, context_msgs)
+        if sum(map(message_tokens, messages)) > self.budget and self.summary:
+            messages = self._assemble(system_prompt, history, step, context_msgs, with_summary=False)
+        return messages
@@ -0,0 +1,93 @@
+import os
+import zlib
+
+import numpy as np
+
+from text_utils import words
+
+# ─── Near-duplicate chunks ────────────────────────────────────────────────────
+# A chunk's MinHash signature (NUM_PERM minimums of hashed word SHINGLE-grams)
+# estimates the Jaccard similarity of two chunks as the share of equal
+# positions. LSH splits signatures into BANDS bands; chunks sharing any band
+# are candidates, which finds pairs above ~0.5 similarity with high
+# probability while comparing each chunk with only a handful of others.
+NUM_PERM = 128
+BANDS = 32
+SHINGLE = 5
+THRESHOLD = 0.8  # estimated Jaccard similarity at which two chunks are merged
+SIGNATURE_IDS = "minhash.ids.npy"
+SIGNATURES = "minhash.sigs.npy"
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str, size: int = SHINGLE) -> set[int]:
+    """Hashes of the text's word size-grams (one gram for shorter texts)."""
+    tokens = words(text)
+    grams = [" ".join(tokens[i : i + size]) for i in range(max(1, len(tokens) - size + 1))]
+    return {zlib.crc32(gram.encode("utf8")) & _PRIME for gram in grams}
+
+
+def signature(text: str) -> np.ndarray:
+    x = np.fromiter(shingles(text), dtype=np.uint64)
+    return ((np.outer(x, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def jaccard(a: str, b: str) -> float:
+    """Exact Jaccard similarity of two texts' shingle sets."""
+    sa, sb = shingles(a), shingles(b)
+    return len(sa & sb) / len(sa | sb) if sa or sb else 1.0
+
+
+class MinHashLSH:
+    """Chunk id → signature, with banded buckets to find near-duplicates."""
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self._rows = NUM_PERM // BANDS
+        self._buckets: dict[tuple[int, bytes], list[int]] = {}
+        self.signatures: dict[int, np.ndarray] = {}
+
+    def _bands(self, sig: np.ndarray):
+        for band in range(BANDS):
+            yield band, sig[band * self._rows : (band + 1) * self._rows].tobytes()
+
+    def add(self, chunk_id: int, sig: np.ndarray):
+        if chunk_id in self.signatures:
+            return
+        self.signatures[chunk_id] = sig
+        for key in self._bands(sig):
+            self._buckets.setdefault(key, []).append(chunk_id)
+
+    def find(self, sig: np.ndarray) -> int | None:
+        """The most similar indexed chunk at or above threshold, if any."""
+        best, best_score = None, self.threshold
+        seen = set()
+        for key in self._bands(sig):
+            for chunk_id in self._buckets.get(key, ()):
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                score = float(np.mean(self.signatures[chunk_id] == sig))
+                if score >= best_score:
+                    best, best_score = chunk_id, score
+        return best
+
+
+def load_signatures(directory: str) -> dict[int, np.ndarray]:
+    """Signatures saved with a build, by chunk id; empty for older builds."""
+    ids_path, sigs_path = os.path.join(directory, SIGNATURE_IDS), os.path.join(directory, SIGNATURES)
+    if not (os.path.exists(ids_path) and os.path.exists(sigs_path)):
+        return {}
+    ids, sigs = np.load(ids_path), np.load(sigs_path)
+    return dict(zip(ids.tolist(), sigs))
+
+
+def save_signatures(directory: str, signatures: dict[int, np.ndarray]):
+    ids = np.array(sorted(signatures), dtype="int64")
+    sigs = np.stack([signatures[i] for i in ids.tolist()]) if len(ids) else np.zeros((0, NUM_PERM), np.uint32)
+    np.save(os.path.join(directory, SIGNATURE_IDS), ids)
+    np.save(os.path.join(directory, SIGNATURES), sigs)
@@ -0,0 +1,75 @@
+import os
+import shutil
+from datetime import datetime
+
+# ─── Versioned index directories ──────────────────────────────────────────────
+# FAISS_DATA_DIR/
+#   versions/<version>/   one complete build: index, vectors, chunk store, BM25, manifest
+#   CURRENT               the version the apps should serve
+# ingest_books.py builds into a staging directory, renames it into versions/
+# and only then points CURRENT at it (atomically), so a reader never sees a
+# half-written build or an index paired with another build's chunks.
+# Trees built before versioning keep their files directly in FAISS_DATA_DIR;
+# resolve() treats that as an unnamed version.
+CURRENT_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+def current_version(root: str) -> str | None:
+    try:
+        with open(os.path.join(root, CURRENT_NAME), encoding="utf8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(root: str) -> tuple[str | None, str]:
+    """(version, directory) of the build currently published under root."""
+    version = current_version(root)
+    if version is None:
+        return None, root
+    return version, os.path.join(root, VERSIONS_DIR, version)
+
+
+def stage(root: str) -> tuple[str, str]:
+    """Pick a new version name and create its staging directory."""
+    versions = os.path.join(root, VERSIONS_DIR)
+    os.makedirs(versions, exist_ok=True)
+    base = datetime.now().strftime("%Y%m%dT%H%M%S")
+    version, n = base, 1
+    while os.path.exists(os.path.join(versions, version)):
+        n += 1
+        version = f"{base}-{n}"
+    staging = os.path.join(versions, f".{version}.staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    return version, staging
+
+
+def publish(root: str, version: str, staging: str):
+    """Move a finished build into place and make it current."""
+    os.rename(staging, os.path.join(root, VERSIONS_DIR, version))
+    tmp = os.path.join(root, f"{CURRENT_NAME}.tmp")
+    with open(tmp, "w", encoding="utf8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_NAME))
+
+
+def prune(root: str, keep: int) -> list[str]:
+    """Delete all but the newest keep versions (never the current one); returns those removed.
+
+    Staging directories left by interrupted builds are deleted too, so call it
+    only when no other build is running.
+    """
+    versions = os.path.join(root, VERSIONS_DIR)
+    current = current_version(root)
+    names = sorted(name for name in os.listdir(versions) if not name.startswith("."))
+    removed = [name for name in names[:-keep] if name != current] if keep > 0 else []
+    for name in removed:
+        shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+    for name in os.listdir(versions):
+        if name.startswith(".") and name.endswith(".staging"):
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+    return removed
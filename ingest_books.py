@@ -2,51 +2,417 @@
 
 import os
 import sys
+import json
+import hashlib
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from itertools import islice
+from typing import Iterable
+
 import faiss
 import numpy as np
-import openai
-from glob import glob
+from openai import (
+    OpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+import ann_index
+import bm25
+import chunk_store
+import dedup
+import index_versions
+import metrics
+from chunking import MAX_TOKENS, OVERLAP_TOKENS, chunk_book
+
+EMBED_MODEL = "text-embedding-ada-002"
+BATCH_SIZE = 256  # inputs per embeddings request (the API accepts up to 2048)
+MAX_WORKERS = 4  # concurrent embeddings requests in flight
+MAX_RETRIES = 6
+MAX_BACKOFF = 60.0  # seconds
+
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+# ─── Embedding backends ───────────────────────────────────────────────────────
+# A backend is any callable taking a list of strings and returning one vector
+# per string, in order. Point the OpenAI backend at a local fake server with
+# --base-url (or OPENAI_BASE_URL) to run an ingest without network access.
+class OpenAIEmbedder:
+    def __init__(self, client: OpenAI, model: str = EMBED_MODEL):
+        self.client = client
+        self.model = model
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        resp = self.client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def _retry_after(err: Exception) -> float | None:
+    """Seconds the server asked us to wait, if it said so."""
+    response = getattr(err, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _RateGate:
+    """Shared pause so one 429 backs off every worker, not just the one that hit it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+class _Progress:
+    def __init__(self, total: int, every: float = 5.0):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.requests = 0
+        self.retries = 0
+        self.started = time.monotonic()
+        self._last = self.started
+        self._lock = threading.Lock()
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def advance(self, n: int):
+        with self._lock:
+            self.done += n
+            self.requests += 1
+            now = time.monotonic()
+            if now - self._last >= self.every:
+                self._last = now
+                self.report()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        done = f"{self.done:,}/{self.total:,}" if self.total else f"{self.done:,}"
+        print(
+            f"  embedded {done} chunks · {self.rate:,.1f} chunks/s"
+            f" · {self.requests:,} requests · {self.retries:,} retries",
+            file=sys.stderr,
+        )
+
+
+def _embed_batch(embed, batch: list[str], gate: _RateGate, progress: _Progress) -> np.ndarray:
+    with metrics.span("ingest_embed_batch") as span:
+        span.add(inputs=len(batch))
+        for attempt in range(MAX_RETRIES + 1):
+            gate.wait()
+            try:
+                vectors = embed(batch)
+                break
+            except RETRYABLE_ERRORS as err:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = _retry_after(err)
+                if delay is None:
+                    # Exponential backoff with full jitter
+                    delay = random.uniform(0, min(MAX_BACKOFF, 2 ** attempt))
+                if isinstance(err, RateLimitError):
+                    gate.pause(delay)
+                progress.retried()
+                span.add(retries=1)
+                time.sleep(delay)
+    if len(vectors) != len(batch):
+        raise RuntimeError(f"Backend returned {len(vectors)} vectors for {len(batch)} inputs")
+    progress.advance(len(batch))
+    return np.asarray(vectors, dtype="float32")
+
+
+def embed_chunks(
+    chunks: Iterable[str],
+    embed,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = MAX_WORKERS,
+    total: int | None = None,
+) -> np.ndarray:
+    """Embed chunks in batched requests over a bounded worker pool, preserving order.
+
+    chunks may be any iterable; it is consumed one batch at a time.
+    """
+    if total is None and hasattr(chunks, "__len__"):
+        total = len(chunks)
+    progress = _Progress(total or 0)
+    gate = _RateGate()
+    parts = []
+    chunks = iter(chunks)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        while batch := list(islice(chunks, batch_size)):
+            # Keep at most two batches per worker in flight
+            if len(pending) >= 2 * max_workers:
+                parts.append(pending.popleft().result())
+            pending.append(pool.submit(_embed_batch, embed, batch, gate, progress))
+        while pending:
+            parts.append(pending.popleft().result())
+    progress.report()
+    if not parts:
+        return np.empty((0, 0), dtype="float32")
+    return np.concatenate(parts)
+
+
+# ─── Incremental state ────────────────────────────────────────────────────────
+# manifest.json records a content hash per book and, for every chunk, its hash
+# and FAISS id. A rebuild only embeds chunks whose hash is new; vectors whose
+# ids are no longer referenced by any book are removed from the exact,
+# ID-mapped vectors.faiss, from which the served index.faiss is then derived.
+MANIFEST_NAME = "manifest.json"
+VECTORS_NAME = "vectors.faiss"
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf8")).hexdigest()
+
+
+def _save_json(path: str, obj):
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(obj, f)
+
+
+def _empty_manifest(model: str, chunker: dict) -> dict:
+    return {"model": model, "chunker": chunker, "next_id": 0, "books": {}}
+
+
+def load_state(out_dir: str, model: str, chunker: dict):
+    """Return (manifest, exact vectors index, chunk store) from a previous build, or empty state."""
+    empty = _empty_manifest(model, chunker), None, None
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    vectors_path = os.path.join(out_dir, VECTORS_NAME)
+    if not os.path.exists(vectors_path):
+        # Builds before index types were selectable kept the exact index in index.faiss
+        vectors_path = os.path.join(out_dir, "index.faiss")
+    if not (os.path.exists(manifest_path) and os.path.exists(vectors_path) and chunk_store.exists(out_dir)):
+        return empty
+    with open(manifest_path, encoding="utf8") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != model or manifest.get("chunker") != chunker:
+        print("ℹ️ Embedding model or chunking changed; rebuilding from scratch.", file=sys.stderr)
+        return empty
+    exact = faiss.read_index(vectors_path)
+    if not (isinstance(exact, faiss.IndexIDMap2) and isinstance(faiss.downcast_index(exact.index), faiss.IndexFlat)):
+        print("ℹ️ No exact ID-mapped vectors to update; rebuilding from scratch.", file=sys.stderr)
+        return empty
+    return manifest, exact, chunk_store.ChunkStore(out_dir)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Build or update the FAISS book index.")
+    parser.add_argument("--books-dir", default="extracted_books")
+    parser.add_argument("--out-dir", default=os.getenv("FAISS_DATA_DIR", "faiss_index"),
+                        help="Data directory; each build is published to <out-dir>/versions/")
+    parser.add_argument("--keep", type=int, default=3, help="Published versions to keep")
+    parser.add_argument("--model", default=EMBED_MODEL)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"),
+                        help="Embeddings endpoint, e.g. a local fake server")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS,
+                        help="Token budget per chunk")
+    parser.add_argument("--overlap", type=int, default=OVERLAP_TOKENS,
+                        help="Tokens of trailing context repeated in the next chunk")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the manifest and re-embed every chunk")
+    parser.add_argument("--dedup-threshold", type=float, default=dedup.THRESHOLD,
+                        help="Similarity at which a chunk is merged into a near-duplicate (0 disables)")
+    parser.add_argument("--index-type", choices=ann_index.INDEX_TYPES, default="flat",
+                        help="Served index: exact flat, HNSW, IVF-Flat or IVF-PQ")
+    parser.add_argument("--storage", choices=ann_index.STORAGE_TYPES, default="float32",
+                        help="How the served index stores vectors: float32, fp16, int8 (sq8) or PQ codes")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default ~4·√chunks)")
+    parser.add_argument("--nprobe", type=int, help=f"IVF lists probed per query (default {ann_index.NPROBE})")
+    parser.add_argument("--hnsw-m", type=int, help=f"HNSW neighbours per node (default {ann_index.HNSW_M})")
+    parser.add_argument("--ef-search", type=int, help=f"HNSW search breadth (default {ann_index.EF_SEARCH})")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--report-k", type=int, default=10, help="k for the recall@k report")
+    args = parser.parse_args(argv)
+    # Checked before anything is embedded, not when the index is built at the end
+    error = ann_index.storage_error(args.index_type, args.storage)
+    if error:
+        parser.error(error)
+
+    # 0) Load API key
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key and not args.base_url:
+        print("❌ Missing OPENAI_API_KEY", file=sys.stderr)
+        sys.exit(1)
+    client = OpenAI(api_key=api_key or "local", base_url=args.base_url, max_retries=0)
+    embed = OpenAIEmbedder(client, args.model)
+
+    # 1) Load the previous build, if any
+    chunker = {"max_tokens": args.max_tokens, "overlap_tokens": args.overlap}
+    if args.full:
+        old, index, old_store = _empty_manifest(args.model, chunker), None, None
+    else:
+        _, previous_dir = index_versions.resolve(args.out_dir)
+        old, index, old_store = load_state(previous_dir, args.model, chunker)
+    old_ids = {c["hash"]: c["id"] for book in old["books"].values() for c in book["chunks"]}
+    manifest = _empty_manifest(args.model, chunker)
+    manifest["next_id"] = old["next_id"]
+
+    paths = sorted(glob(os.path.join(args.books_dir, "*.txt")))
+    if not paths:
+        print(f"⚠️ No .txt in {args.books_dir}/", file=sys.stderr)
+    digests = {path: _file_hash(path) for path in paths}
+    unchanged = [
+        os.path.basename(path) for path in paths
+        if old["books"].get(os.path.basename(path), {}).get("sha256") == digests[path]
+    ]
+
+    # MinHash signatures of the chunks that stay live through unchanged books;
+    # new chunks are added as they are produced. An edited book's old chunks
+    # are left out, or its corrections would be merged back into them.
+    lsh = dedup.MinHashLSH(args.dedup_threshold)
+    saved = dedup.load_signatures(previous_dir) if old_store is not None else {}
+    for i in sorted({c["id"] for name in unchanged for c in old["books"][name]["chunks"]}):
+        sig = saved.get(i)
+        if sig is None and old_store.text(i) is not None:
+            sig = dedup.signature(old_store.text(i))
+        if sig is not None:
+            lsh.add(i, sig)
+    # Build into a staging directory; it is published only once complete
+    version, build_dir = index_versions.stage(args.out_dir)
+    writer = chunk_store.ChunkStoreWriter(build_dir)
+    new_ids = []
+    changed = merged = 0
+
+    # 2) Hash every .txt file; stream only the new or changed ones through the
+    #    chunker, writing unseen chunks to the new store as they are produced.
+    #    A near-duplicate of a known chunk reuses that chunk's id instead.
+    def new_chunk_texts():
+        nonlocal changed, merged
+        for path in paths:
+            name = os.path.basename(path)
+            digest = digests[path]
+            previous = old["books"].get(name)
+            if previous and previous["sha256"] == digest:
+                manifest["books"][name] = previous
+                continue
+            changed += 1
+            entries = []
+            for chunk in chunk_book(path, args.max_tokens, args.overlap):
+                h = _chunk_hash(chunk.text)
+                if h not in old_ids:
+                    sig = dedup.signature(chunk.text)
+                    duplicate = lsh.find(sig) if args.dedup_threshold > 0 else None
+                    if duplicate is not None:
+                        old_ids[h] = duplicate
+                        merged += 1
+                        entries.append({"hash": h, "id": duplicate})
+                        continue
+                    old_ids[h] = manifest["next_id"]
+                    manifest["next_id"] += 1
+                    lsh.add(old_ids[h], sig)
+                    writer.add(old_ids[h], chunk.text, chunk.book, chunk.chapter, chunk.offset)
+                    new_ids.append(old_ids[h])
+                    yield chunk.text
+                entries.append({"hash": h, "id": old_ids[h]})
+            manifest["books"][name] = {"sha256": digest, "chunks": entries}
+
+    # 3) Embed the new chunks via batched, concurrent requests
+    started = time.monotonic()
+    with metrics.span("ingest_chunk_and_embed") as span:
+        matrix = embed_chunks(new_chunk_texts(), embed, args.batch_size, args.workers)  # shape (num_new, dim)
+        span.add(chunks=len(new_ids), near_duplicates=merged)
+    elapsed = time.monotonic() - started
+
+    if new_ids and not len(matrix):
+        print("❌ No embeddings generated; check your API key and texts.", file=sys.stderr)
+        sys.exit(1)
+    if index is None:
+        if not new_ids:
+            print("❌ No chunks to index.", file=sys.stderr)
+            sys.exit(1)
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(matrix.shape[1]))
+    if new_ids:
+        index.add_with_ids(matrix, np.array(new_ids, dtype="int64"))
+
+    # 4) Drop vectors no book references any more; carry the rest into the new store
+    live = {c["id"] for book in manifest["books"].values() for c in book["chunks"]}
+    stale = []
+    if old_store is not None:
+        for i in old_store.ids().tolist():
+            if i in live:
+                writer.add(i, old_store.text(i), *old_store.source(i))
+            else:
+                stale.append(i)
+    if stale:
+        index.remove_ids(np.array(stale, dtype="int64"))
+
+    # 5) Build the served index from the exact vectors and measure it against them
+    with metrics.span("ingest_index_build", index_type=args.index_type, storage=args.storage):
+        ids, vectors = ann_index.export_vectors(index)
+        served, params = ann_index.build_index(
+            args.index_type, vectors, ids, args.storage,
+            nlist=args.nlist, nprobe=args.nprobe, hnsw_m=args.hnsw_m,
+            ef_search=args.ef_search, pq_m=args.pq_m,
+        )
+    with metrics.span("ingest_recall_report", index_type=args.index_type):
+        report = ann_index.recall_report(served, params, index, vectors, k=args.report_k)
+    ann_index.print_report(report)
+
+    # 6) Save the chunk store (indexed by FAISS id) and its BM25 index, both
+    #    vector indexes and the manifest
+    with metrics.span("ingest_save"):
+        writer.close(size=manifest["next_id"])
+        vocabulary = bm25.build(chunk_store.ChunkStore(build_dir), build_dir)
+        dedup.save_signatures(build_dir, {i: lsh.signatures[i] for i in live if i in lsh.signatures})
+        faiss.write_index(index, os.path.join(build_dir, VECTORS_NAME))
+        faiss.write_index(served, os.path.join(build_dir, "index.faiss"))
+        _save_json(os.path.join(build_dir, ann_index.PARAMS_NAME), params)
+        _save_json(os.path.join(build_dir, ann_index.REPORT_NAME), report)
+        _save_json(os.path.join(build_dir, MANIFEST_NAME), manifest)
+
+    # 7) Publish: move the build into versions/ and point CURRENT at it
+    with metrics.span("ingest_publish"):
+        index_versions.publish(args.out_dir, version, build_dir)
+        pruned = index_versions.prune(args.out_dir, args.keep)
+
+    removed = len(set(old["books"]) - set(manifest["books"]))
+    print(f"✅ Index has {index.ntotal} chunks from {len(manifest['books'])} books "
+          f"({changed} new/changed, {removed} removed). Embedded {len(new_ids)} chunks "
+          f"in {elapsed:.1f}s ({len(new_ids) / max(elapsed, 1e-9):,.1f} chunks/s), "
+          f"removed {len(stale)}. BM25 vocabulary: {vocabulary:,} terms.")
+    if merged:
+        print(f"✅ Merged {merged} near-duplicate chunks into existing ones "
+              f"({merged / (merged + len(new_ids)):.1%} of new chunks), saving {merged} embeddings.")
+    print(f"✅ Published version {version}" + (f"; pruned {', '.join(pruned)}." if pruned else "."))
+
 
-# 0) Load API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    print("❌ Missing OPENAI_API_KEY", file=sys.stderr)
-    sys.exit(1)
-
-# 1) Read all .txt files
-texts = []
-for path in glob("extracted_books/*.txt"):
-    with open(path, encoding="utf8") as f:
-        texts.append(f.read())
-if not texts:
-    print("⚠️ No .txt in extracted_books/", file=sys.stderr)
-
-# 2) Simple 1 000-char chunking
-chunks = []
-for doc in texts:
-    for i in range(0, len(doc), 1000):
-        chunks.append(doc[i : i + 1000])
-
-# 3) Embed via OpenAI
-vectors = []
-for chunk in chunks:
-    resp = openai.Embedding.create(model="text-embedding-ada-002", input=chunk)
-    vectors.append(np.array(resp["data"][0]["embedding"], dtype="float32"))
-
-if not vectors:
-    print("❌ No embeddings generated; check your API key and texts.", file=sys.stderr)
-    sys.exit(1)
-
-matrix = np.stack(vectors)  # shape (num_chunks, dim)
-
-# 4) Build and save FAISS index
-dim = matrix.shape[1]
-index = faiss.IndexFlatL2(dim)
-index.add(matrix)
-os.makedirs("faiss_index", exist_ok=True)
-faiss.write_index(index, "faiss_index/index.faiss")
-
-# 5) Save the raw chunk texts
-np.save("faiss_index/texts.npy", np.array(chunks, dtype=object))
-
-print(f"✅ Built FAISS index with {len(chunks)} chunks.")
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,73 @@
 import os
-import json
+import time
+import logging
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 import streamlit as st
-from openai import OpenAI
-from book_retrieval import search_books
+import agenda_engine
+import metrics
+import resources
+from conversation_context import AGENDA, BOILERPLATE, CHAT, ConversationContext, message_tokens, summarize_with
+from session_store import SessionStore
+from text_utils import count_tokens
+# book_retrieval and step_excerpts (numpy, faiss, openai) are imported where a
+# turn needs them, so the login page renders before they load
 
 # ---------- CONFIGURATION ----------
 MEETING_SCRIPTS_DIR = "meeting_scripts"
+# Prompt tokens per mentor turn; older agenda steps are folded into a summary to stay under it
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "10"))
+CHAT_HISTORY_DIR = os.getenv(
+    "CHAT_HISTORY_DIR",
+    os.path.join(os.getcwd(), "data", "faiss_index", "chat_history"),
+)
+# Seconds a turn waits for book excerpts before the mentor answers without them.
+# Retrieval gives up on a stalled embeddings call after EMBED_TIMEOUT and falls
+# back to lexical results, so by default the turn waits a second longer than that.
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "5"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", str(EMBED_TIMEOUT + 1)))
+TURN_WORKERS = int(os.getenv("TURN_WORKERS", "8"))
+
+logger = logging.getLogger(__name__)
 
 # ---------- UTILITIES ----------
-def load_agenda(meeting_name: str) -> list[dict] | None:
-    filename = f"{meeting_name}.json"
-    path = os.path.join(MEETING_SCRIPTS_DIR, filename)
-    if not os.path.exists(path):
+def load_agenda(meeting_name: str) -> agenda_engine.Agenda | None:
+    # Compiled once per process and shared by every session; re-read only when the file changes.
+    # None for a missing or malformed script, which is reported at login.
+    if not meeting_name:
+        return None
+    try:
+        return agenda_engine.load(meeting_name, MEETING_SCRIPTS_DIR, (".json",))
+    except ValueError as err:  # invalid JSON, or not a list of steps
+        logger.error("Meeting script %s could not be loaded: %s", meeting_name, err)
         return None
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    # One journal connection per process, shared by every session
+    return SessionStore(CHAT_HISTORY_DIR)
+
+@st.cache_resource
+def get_turn_executor() -> ThreadPoolExecutor:
+    # Journal writes and retrieval of every session run here, off the script thread
+    return ThreadPoolExecutor(TURN_WORKERS, thread_name_prefix="mentor-turn")
+
+@st.cache_resource
+def start_warm_up():
+    # Loads the library, clients and heavy imports in the background, once per process
+    return resources.start_warm_up()
+
+@st.cache_resource
+def start_metrics_server():
+    # GET /metrics on METRICS_PORT, if set; one server per process
+    return metrics.serve()
 
 # ---------- PAGE SETUP ----------
 st.set_page_config(page_title="Mashauri AI Mentor", layout="centered")
+start_warm_up()
 
 # ---------- HEADER ----------
 col1, col2, col3 = st.columns([1, 6, 1])
@@ -37,7 +86,6 @@ OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_KEY:
     st.error("Missing OPENAI_API_KEY")
     st.stop()
-client = OpenAI(api_key=OPENAI_KEY)
 
 # ---------- SYSTEM PROMPT ----------
 MENTOR_SYSTEM_PROMPT = {
@@ -67,68 +115,198 @@ MENTOR_SYSTEM_PROMPT = {
 }
 
 # ---------- AUTHENTICATION & SESSION ----------
+def start_session(name: str, meeting_type: str, resume: dict | None = None) -> bool:
+    # The session keeps the agenda compiled here, so editing the script mid-meeting can't move its steps;
+    # False if the meeting's script can't be loaded
+    if resume is not None:
+        meeting_type = resume["meeting_type"]
+    agenda = load_agenda(meeting_type)
+    if meeting_type and agenda is None:
+        st.error(f"The meeting script {meeting_type} could not be loaded.")
+        return False
+    st.session_state.team = name
+    st.session_state.meeting_type = meeting_type
+    st.session_state.agenda = agenda
+    if resume is None:
+        st.session_state.session_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    else:
+        st.session_state.session_id = resume["session_id"]
+        # The script may have lost steps since the session was saved
+        st.session_state.step = min(resume["step"], len(agenda) - 1) if agenda else resume["step"]
+        if resume["state"]:
+            st.session_state.state = resume["state"]
+        st.session_state.history = [MENTOR_SYSTEM_PROMPT] + get_session_store().load_messages(
+            name, resume["session_id"]
+        )
+    return True
+
+if "team" not in st.session_state and "login" in st.session_state:
+    # Logged in: offer to resume one of this team's earlier sessions
+    login = st.session_state.login
+    resume = st.selectbox(
+        "Session",
+        [None] + get_session_store().list_sessions(login["team"]),
+        format_func=lambda s: f"Start a new {login['meeting_type']} meeting" if s is None else (
+            f"Resume {s['meeting_type'] or 'meeting'} started {s['created_at'].replace('T', ' ')}"
+            f" ({s['messages']} messages)"
+        ),
+    )
+    if st.button("Continue") and start_session(login["team"], login["meeting_type"], resume):
+        del st.session_state.login
+        st.rerun()
+    st.stop()
+
 if "team" not in st.session_state:
     # Login form
     name = st.text_input("Team name")
     pw = st.text_input("Password", type="password")
     st.write("Please select your meeting type from the dropdown list")
-    # List available meeting scripts directly
-    scripts = [f[:-5] for f in os.listdir(MEETING_SCRIPTS_DIR) if f.endswith(".json")]
+    scripts = agenda_engine.list_scripts(MEETING_SCRIPTS_DIR, (".json",))
     meeting_type = st.selectbox("Meeting type", scripts)
     if st.button("Login"):
         if pw == "guideme":
-            st.session_state.team = name
-            st.session_state.session_id = datetime.now().strftime("%Y%m%dT%H%M%S")
-            st.session_state.meeting_type = meeting_type
-            # Load the selected agenda from JSON files
-            st.session_state.agenda = load_agenda(meeting_type)
-            st.rerun()
+            # Earlier sessions are listed only once the password is checked
+            if get_session_store().list_sessions(name):
+                st.session_state.login = {"team": name, "meeting_type": meeting_type}
+                st.rerun()
+            elif start_session(name, meeting_type):
+                st.rerun()
         else:
             st.error("Invalid credentials")
     st.stop()
 
 team = st.session_state.team
 session_id = st.session_state.session_id
-agenda = st.session_state.get("agenda")
+# One client per process, shared by every session
+client = resources.openai_client()
+agenda = st.session_state.agenda
 
 # ---------- HISTORY & STATE ----------
-data_dir = os.getenv(
-    "CHAT_HISTORY_DIR",
-    os.path.join(os.getcwd(), "data", "faiss_index", "chat_history"),
-)
-os.makedirs(data_dir, exist_ok=True)
-history_file = os.path.join(data_dir, f"{team}_{session_id}_history.json")
+store = get_session_store()
+start_metrics_server()
 
 if "step" not in st.session_state:
     st.session_state.step = 0
 if "state" not in st.session_state:
     st.session_state.state = "awaiting_agenda_prompt" if agenda else "awaiting_team_input"
+if "context" not in st.session_state:
+    st.session_state.context = ConversationContext(CONTEXT_TOKEN_BUDGET)
 if "history" not in st.session_state:
     st.session_state.history = [MENTOR_SYSTEM_PROMPT]
-    with open(history_file, "w", encoding="utf-8") as f:
-        json.dump(st.session_state.history, f, indent=2)
+    store.start_session(team, session_id, st.session_state.get("meeting_type", ""), st.session_state.state)
+
+# Every step/state change ends in st.rerun(), so recording it here keeps the journal current
+progress = (st.session_state.step, st.session_state.state)
+if st.session_state.get("saved_progress") != progress:
+    store.update_progress(team, session_id, *progress)
+    st.session_state.saved_progress = progress
 
 # ---------- SIDEBAR ----------
 st.sidebar.title("Agenda")
 if agenda:
     for idx, item in enumerate(agenda):
         marker = "➡️" if idx == st.session_state.step else "  "
-        st.sidebar.write(f"{marker} Step {idx+1}: {item['title']}")
+        st.sidebar.write(f"{marker} Step {idx+1}: {item.title}")
 else:
     st.sidebar.write("No agenda selected.")
 
 # ---------- HELPERS ----------
-def save_history():
-    with open(history_file, "w", encoding="utf-8") as f:
-        json.dump(st.session_state.history, f, indent=2)
+def _write_message(previous: Future | None, store: SessionStore, team: str, session_id: str, message: dict):
+    # Journal rows must keep the chat's order, so wait for the session's previous write
+    if previous is not None:
+        previous.exception()
+    try:
+        with metrics.span("journal_write"):
+            store.append_message(team, session_id, message)
+    except Exception:
+        logger.exception("Could not journal a message of %s/%s", team, session_id)
+
+def turn_labels() -> dict:
+    # Spans of a turn are reported per meeting type and agenda step
+    return {"meeting_type": st.session_state.get("meeting_type") or "", "step": st.session_state.step}
 
-def add_mentor_message(text: str):
-    st.session_state.history.append({"role": "assistant", "content": text})
-    save_history()
+def turn_context() -> contextvars.Context:
+    # Carries the turn's labels to work submitted to the executor
+    with metrics.labels(**turn_labels()):
+        return contextvars.copy_context()
+
+def record_message(message: dict):
+    # Append-only: one journal row per message, written in the background
+    st.session_state.history.append(message)
+    st.session_state.pending_write = get_turn_executor().submit(
+        turn_context().run, _write_message, st.session_state.get("pending_write"), store, team, session_id, message
+    )
+
+def add_mentor_message(text: str, kind: str = CHAT):
+    record_message({"role": "assistant", "content": text, "kind": kind, "step": st.session_state.step})
 
 def add_user_message(text: str):
-    st.session_state.history.append({"role": "user", "content": text})
-    save_history()
+    record_message({"role": "user", "content": text, "kind": CHAT, "step": st.session_state.step})
+
+def start_retrieval(query: str) -> Future:
+    """Search the books on the shared executor while the rest of the turn goes on."""
+    # Blends the current step's precomputed excerpts (see step_excerpts.py) with a live query
+    from step_excerpts import excerpts_for_turn
+
+    item = agenda[st.session_state.step] if agenda and st.session_state.step < len(agenda) else None
+    return get_turn_executor().submit(
+        turn_context().run, excerpts_for_turn, query, st.session_state.get("meeting_type", ""), st.session_state.step, item,
+        scripts_dir=MEETING_SCRIPTS_DIR,
+    )
+
+def excerpt_messages(retrieval: Future) -> list[dict]:
+    """The retrieved excerpts as a system message; none if retrieval fails or is too slow."""
+    with metrics.span("retrieval_wait") as span:
+        try:
+            snippets = retrieval.result(timeout=RETRIEVAL_TIMEOUT)
+        except Exception as err:
+            logger.warning("Answering without book excerpts: %s", str(err) or type(err).__name__)
+            span.add(retrieval_failures=1)
+            return []
+    if not snippets:
+        return []
+    from book_retrieval import format_excerpts
+
+    return [{"role": "system", "content": "Relevant book excerpts:\n" + format_excerpts(snippets)}]
+
+def stream_mentor_reply(retrieval: Future, path: str) -> str:
+    """Stream the mentor's reply into a chat bubble as it is generated; return the full text."""
+    # path names the chat path ("reply" to an agenda step, "discussion" after it) in the metrics
+    with metrics.labels(**turn_labels(), path=path), metrics.span("turn"):
+        # The team's message was added after this run rendered the history, so show it first
+        with st.chat_message("user"):
+            st.markdown(st.session_state.history[-1]["content"])
+        context_msgs = excerpt_messages(retrieval)
+        with metrics.span("context_build"):
+            messages = st.session_state.context.build(
+                MENTOR_SYSTEM_PROMPT,
+                st.session_state.history,
+                st.session_state.step,
+                context_msgs,
+                summarize_with(client, SUMMARY_MODEL, SUMMARY_TIMEOUT),
+            )
+        with metrics.span("completion", model="gpt-4o") as span:
+            started = time.perf_counter()
+            stream = client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.7,
+                stream=True,
+            )
+
+            def tokens():
+                first = True
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first:
+                            metrics.record("completion_first_token", time.perf_counter() - started, model="gpt-4o")
+                            first = False
+                        yield chunk.choices[0].delta.content
+
+            with st.chat_message("assistant"):
+                reply = st.write_stream(tokens())
+            span.add(prompt_tokens=sum(map(message_tokens, messages)), completion_tokens=count_tokens(reply))
+        return reply
 
 # ---------- RENDER MESSAGES ----------
 for msg in st.session_state.history[1:]:
@@ -137,7 +315,7 @@ for msg in st.session_state.history[1:]:
 
 # ---------- AGENDA PROMPT ----------
 if st.session_state.state == "awaiting_agenda_prompt" and agenda:
-    add_mentor_message(agenda[st.session_state.step]["prompt"])
+    add_mentor_message(agenda[st.session_state.step].prompt, kind=AGENDA)
     st.session_state.state = "awaiting_team_input"
     st.rerun()
 
@@ -152,29 +330,19 @@ if user_input:
 
     if st.session_state.state == "awaiting_team_input":
         if is_first and agenda and response.lower() != "yes":
-            add_mentor_message("Please type exactly: `Yes` to start the meeting.")
+            add_mentor_message("Please type exactly: `Yes` to start the meeting.", kind=BOILERPLATE)
             st.rerun()
 
-        snippets = []
-        context_msgs = []
         if response and not (is_first and agenda):
-            snippets = search_books(response)
-            if snippets:
-                excerpts = "\n---\n".join(snippets)
-                context_msgs.append({"role": "system", "content": "Relevant book excerpts:\n" + excerpts})
-            resp = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[MENTOR_SYSTEM_PROMPT] + context_msgs + st.session_state.history[1:],
-                temperature=0.7,
-            )
-            mentor_reply = resp.choices[0].message.content
+            mentor_reply = stream_mentor_reply(start_retrieval(response), "reply")
             add_mentor_message(mentor_reply)
 
         if agenda:
             if is_first and response.lower() == "yes":
-                next_title = agenda[1]["title"] if len(agenda) > 1 else "next step"
+                next_title = agenda[1].title if len(agenda) > 1 else "next step"
                 add_mentor_message(
-                    f"Great - lets get this meeting started then, I am excited to be working with you today. Type Next and we can move into the {next_title} step"
+                    f"Great - lets get this meeting started then, I am excited to be working with you today. Type Next and we can move into the {next_title} step",
+                    kind=BOILERPLATE,
                 )
                 st.session_state.state = "awaiting_next_action"
             else:
@@ -186,7 +354,8 @@ if user_input:
                 else:
                     add_mentor_message(
                         "Would you like to move to the next stage of the agenda or continue to discuss this topic further?\n\n"
-                        "👉 Type your next comment, reply or question to continue, or type **Next** to move on."
+                        "👉 Type your next comment, reply or question to continue, or type **Next** to move on.",
+                        kind=BOILERPLATE,
                     )
                     st.session_state.state = "awaiting_next_action"
             st.rerun()
@@ -203,22 +372,13 @@ if user_input:
             else:
                 add_mentor_message(
                     "Meeting complete! Thank you for your participation. 🎉.\n\n"
-                    "Click Next again and you will be taken to the Google form to complete at the end of every mentor meeting"
+                    "Click Next again and you will be taken to the Google form to complete at the end of every mentor meeting",
+                    kind=BOILERPLATE,
                 )
                 st.session_state.state = "meeting_done"
                 st.rerun()
         else:
-            snippets = search_books(response)
-            context_msgs = []
-            if snippets:
-                excerpts = "\n---\n".join(snippets)
-                context_msgs.append({"role": "system", "content": "Relevant book excerpts:\n" + excerpts})
-            resp = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[MENTOR_SYSTEM_PROMPT] + context_msgs + st.session_state.history[1:],
-                temperature=0.7,
-            )
-            mentor_reply = resp.choices[0].message.content
+            mentor_reply = stream_mentor_reply(start_retrieval(response), "discussion")
             add_mentor_message(mentor_reply)
             if (
                 st.session_state.get("meeting_type") == "General_conversation"
@@ -228,7 +388,8 @@ if user_input:
             else:
                 add_mentor_message(
                     "Would you like to keep discussing, or move to the next step?\n\n"
-                    "Type your next comment, or **Next** to move on."
+                    "Type your next comment, or **Next** to move on.",
+                    kind=BOILERPLATE,
                 )
             st.rerun()
 
@@ -1,5 +1,6 @@
 import streamlit as st
-import os
+
+import agenda_engine
 
 # --- Settings ---
 SCRIPT_FOLDER = "meeting_scripts"
@@ -12,9 +13,6 @@ TEAM_PASSWORDS = {
 }
 
 # --- Helpers ---
-def get_meeting_scripts():
-    return [f for f in os.listdir(SCRIPT_FOLDER) if f.endswith('.txt')]
-
 def next_step():
     st.session_state.step += 1
 
@@ -22,6 +20,14 @@ def prev_step():
     if st.session_state.step > 0:
         st.session_state.step -= 1
 
+def nav_buttons(step: int):
+    if st.button("Next", key=f"next_{step}"):
+        next_step()
+        st.rerun()
+    if step > 0 and st.button("Back", key=f"back_{step}"):
+        prev_step()
+        st.rerun()
+
 # --- Main App ---
 
 st.set_page_config(page_title="AI Mentor Meeting")
@@ -38,15 +44,21 @@ if password != TEAM_PASSWORDS[team]:
 st.success(f"Welcome, {team}! Let's start your session.")
 
 # 2. Meeting script selection
-scripts = get_meeting_scripts()
+scripts = agenda_engine.list_scripts(SCRIPT_FOLDER)
 if not scripts:
-    st.error("No meeting scripts found! Add .txt files to the meeting_scripts/ folder.")
+    st.error("No meeting scripts found! Add .txt or .json files to the meeting_scripts/ folder.")
     st.stop()
-script_file = st.selectbox("Choose your meeting:", scripts)
+script_name = st.selectbox("Choose your meeting:", scripts)
 
-# 3. Load script and initialize session state
-with open(os.path.join(SCRIPT_FOLDER, script_file), "r") as f:
-    lines = [l.strip() for l in f.readlines() if l.strip()]
+# 3. Compiled script (shared by every session) and session state
+try:
+    agenda = agenda_engine.load(script_name, SCRIPT_FOLDER)
+except ValueError as err:  # invalid JSON, or not a list of steps
+    st.error(f"The meeting script {script_name} could not be loaded: {err}")
+    st.stop()
+if agenda is None:
+    st.error(f"The meeting script {script_name} was removed.")
+    st.stop()
 
 if "step" not in st.session_state:
     st.session_state.step = 0
@@ -59,11 +71,11 @@ if "member_index" not in st.session_state:
 
 step = st.session_state.step
 
-# --- Main loop ---
-while step < len(lines):
-    content = lines[step]
+# --- Current step ---
+if step < len(agenda):
+    current = agenda[step]
     # --- Multi-member entry block ---
-    if content.startswith("ENTER_TEAM_MEMBERS"):
+    if current.kind == agenda_engine.MEMBERS:
         # Assume previous step asked for number of members
         num_members = st.session_state.inputs[-1] if st.session_state.inputs else 1
         try:
@@ -108,7 +120,6 @@ while step < len(lines):
                     for k in ["name", "email", "reason", "objective"]:
                         st.session_state.pop(prev_prefix + k, None)
                     st.rerun()
-            break  # Don't advance to next step yet
         else:
             st.write("All members entered!")
             for i, m in enumerate(st.session_state.members, 1):
@@ -117,19 +128,15 @@ while step < len(lines):
                 st.session_state.member_index = 0
                 next_step()
                 st.rerun()
-            break
     # --- Standard script logic ---
-    elif content.lower().startswith("step"):
-        st.subheader(content)
-        if st.button("Next", key=f"next_{step}"):
-            next_step()
-            st.rerun()
-        if step > 0 and st.button("Back", key=f"back_{step}"):
-            prev_step()
-            st.rerun()
-        break
-    elif content.endswith(":"):
-        user_input = st.text_input(content, key=f"input_{step}")
+    elif current.kind == agenda_engine.HEADING:
+        st.subheader(current.title)
+        nav_buttons(step)
+    elif current.kind == agenda_engine.INPUT:
+        if current.input_type == "int":
+            user_input = st.number_input(current.prompt, min_value=1, step=1, key=f"input_{step}")
+        else:
+            user_input = st.text_input(current.prompt, key=f"input_{step}")
         if st.button("Save & Next", key=f"save_next_{step}"):
             st.session_state.inputs.append(user_input)
             next_step()
@@ -137,18 +144,15 @@ while step < len(lines):
         if step > 0 and st.button("Back", key=f"back_{step}"):
             prev_step()
             st.rerun()
-        break
+    elif current.kind == agenda_engine.AGENDA:
+        st.subheader(current.title)
+        st.markdown(current.prompt)
+        nav_buttons(step)
     else:
-        st.markdown(content)
-        if st.button("Next", key=f"next_{step}"):
-            next_step()
-            st.rerun()
-        if step > 0 and st.button("Back", key=f"back_{step}"):
-            prev_step()
-            st.rerun()
-        break
+        st.markdown(current.prompt)
+        nav_buttons(step)
 
-if step >= len(lines):
+if step >= len(agenda):
     st.success("Meeting complete! Thanks for participating.")
     st.write("Your session inputs:")
     for i, inp in enumerate(st.session_state.inputs, 1):
@@ -0,0 +1,241 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+# ─── Latency spans ────────────────────────────────────────────────────────────
+#   with metrics.span("completion", model="gpt-4o") as s:
+#       ...
+#       s.add(prompt_tokens=812, completion_tokens=140)
+# Every finished span is one JSON line in a rotating log (METRICS_LOG; empty
+# disables it) and one observation in this process's registry, which keeps
+# the latest METRICS_WINDOW durations per stage and label set for quantiles.
+# Labels set with metrics.labels() (meeting type, agenda step, ...) apply to
+# every span opened inside it, including on threads started with
+# contextvars.copy_context().run. With METRICS_PORT set, GET /metrics serves
+# the registry as Prometheus text on METRICS_HOST (default 127.0.0.1, so only
+# a local scraper or sidecar sees it); `python metrics.py` reports
+# p50/p95/p99 from the log of every process.
+METRICS_LOG = os.getenv("METRICS_LOG", os.path.join("data", "metrics", "metrics.log"))
+METRICS_LOG_BYTES = int(os.getenv("METRICS_LOG_BYTES", str(10 * 1024 * 1024)))
+METRICS_LOG_BACKUPS = int(os.getenv("METRICS_LOG_BACKUPS", "5"))
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+QUANTILES = (0.5, 0.95, 0.99)
+
+_labels: contextvars.ContextVar[dict] = contextvars.ContextVar("metrics_labels", default={})
+_log = logging.getLogger("metrics")
+_log_lock = threading.Lock()
+_log_ready = False
+_server = None
+
+
+def quantile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+class Registry:
+    """Per (stage, labels) series: durations for quantiles, plus summed counters."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._series: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, labels: dict, seconds: float, values: dict | None = None, error: bool = False):
+        key = (stage, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "durations": deque(maxlen=self.window), "count": 0, "sum": 0.0, "errors": 0, "values": {}
+                }
+            series["durations"].append(seconds)
+            series["count"] += 1
+            series["sum"] += seconds
+            series["errors"] += error
+            for name, value in (values or {}).items():
+                series["values"][name] = series["values"].get(name, 0) + value
+
+    def rows(self) -> list[dict]:
+        """One summary per series: stage, labels, count, errors, quantiles and counters."""
+        with self._lock:
+            items = [
+                (key, dict(s, durations=sorted(s["durations"]), values=dict(s["values"])))
+                for key, s in self._series.items()
+            ]
+        rows = []
+        for (stage, labels), series in sorted(items):
+            rows.append({
+                "stage": stage,
+                "labels": dict(labels),
+                "count": series["count"],
+                "errors": series["errors"],
+                "sum": series["sum"],
+                "quantiles": {q: quantile(series["durations"], q) for q in QUANTILES},
+                "values": series["values"],
+            })
+        return rows
+
+    def prometheus(self) -> str:
+        """The registry in the Prometheus text exposition format."""
+        lines = ["# TYPE mentor_stage_seconds summary"]
+        counters: list[str] = []
+        for row in self.rows():
+            labels = {"stage": row["stage"], **row["labels"]}
+            for q, value in row["quantiles"].items():
+                lines.append(f"mentor_stage_seconds{_format_labels(labels, quantile=q)} {value:.6f}")
+            lines.append(f"mentor_stage_seconds_sum{_format_labels(labels)} {row['sum']:.6f}")
+            lines.append(f"mentor_stage_seconds_count{_format_labels(labels)} {row['count']}")
+            counters.append(f"mentor_stage_errors_total{_format_labels(labels)} {row['errors']}")
+            for name, value in sorted(row["values"].items()):
+                counters.append(f"mentor_{name}_total{_format_labels(labels)} {value}")
+        names = sorted({line.split("{", 1)[0] for line in counters})
+        for name in names:
+            lines.append(f"# TYPE {name} counter")
+            lines += [line for line in counters if line.split("{", 1)[0] == name]
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict, **extra) -> str:
+    pairs = {**labels, **extra}
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in pairs.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(pairs, escaped)) + "}"
+
+
+registry = Registry()
+
+
+class Span:
+    def __init__(self, stage: str, labels: dict):
+        self.stage = stage
+        self.labels = labels
+        self.values: dict[str, float] = {}
+
+    def add(self, **values: float):
+        """Add to the span's counters (tokens, cache hits, inputs, ...)."""
+        for name, value in values.items():
+            self.values[name] = self.values.get(name, 0) + value
+
+
+def _write_log(record: dict):
+    global _log_ready
+    if not METRICS_LOG:
+        return
+    if not _log_ready:
+        with _log_lock:
+            if not _log_ready:
+                os.makedirs(os.path.dirname(os.path.abspath(METRICS_LOG)), exist_ok=True)
+                handler = RotatingFileHandler(
+                    METRICS_LOG, maxBytes=METRICS_LOG_BYTES, backupCount=METRICS_LOG_BACKUPS, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                _log.addHandler(handler)
+                _log.setLevel(logging.INFO)
+                _log.propagate = False
+                _log_ready = True
+    _log.info(json.dumps(record, ensure_ascii=False))
+
+
+def record(stage: str, seconds: float, values: dict | None = None, error: bool = False, **labels):
+    """One observation of stage, timed by the caller."""
+    labels = {**_labels.get(), **labels}
+    registry.observe(stage, labels, seconds, values, error)
+    _write_log({
+        "ts": round(time.time(), 3),
+        "stage": stage,
+        "seconds": round(seconds, 6),
+        "labels": labels,
+        "values": values or {},
+        "error": error,
+    })
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time the enclosed block as one observation of stage."""
+    current = Span(stage, labels)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, current.values, error, **current.labels)
+
+
+@contextmanager
+def labels(**values):
+    """Labels for every span opened in the enclosed block."""
+    token = _labels.set({**_labels.get(), **values})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int | None = None, host: str = METRICS_HOST) -> int | None:
+    """Serve /metrics on host:port (default METRICS_PORT) from a daemon thread; once per process."""
+    global _server
+    if _server is None:
+        port = port if port is not None else (int(METRICS_PORT) if METRICS_PORT else None)
+        if port is None:
+            return None
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server.server_address[1]
+
+
+def load_log(path: str = METRICS_LOG) -> Registry:
+    """A registry rebuilt from a metrics log and its rotated files."""
+    loaded = Registry(window=sys.maxsize)
+    paths = [f"{path}.{n}" for n in range(METRICS_LOG_BACKUPS, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                loaded.observe(record["stage"], record["labels"], record["seconds"], record["values"], record["error"])
+    return loaded
+
+
+def print_report(rows: list[dict]):
+    labels = [",".join(f"{k}={v}" for k, v in row["labels"].items()) for row in rows]
+    width = max(map(len, labels), default=0)
+    print(f"{'stage':<22} {'labels':<{width}} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row, label in zip(rows, labels):
+        p50, p95, p99 = (row["quantiles"][q] * 1000 for q in QUANTILES)
+        print(f"{row['stage']:<22} {label:<{width}} {row['count']:>7} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    # python metrics.py [METRICS_LOG]: latency percentiles per stage and label set
+    print_report(load_log(sys.argv[1] if len(sys.argv) > 1 else METRICS_LOG).rows())
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import PyPDF2
+
+# ─── Shared PDF → text extraction ─────────────────────────────────────────────
+# Pages are extracted in a process pool (in page ranges, in order) and written
+# straight to disk, so a 500-page book never sits in one growing string.
+# Results are cached by the PDF's SHA-256: re-uploading a book is a file copy.
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("extracted_books", ".cache"))
+PAGES_PER_TASK = 16
+SERIAL_BELOW = 32  # pages; smaller PDFs aren't worth starting a pool for
+
+_reader = None  # the PdfReader of a pool worker
+
+
+@dataclass(frozen=True)
+class Extraction:
+    path: str  # the .txt file holding the text
+    pages: int
+    chars: int
+    cached: bool
+
+
+def _open_worker(pdf_path: str):
+    global _reader
+    _reader = PyPDF2.PdfReader(pdf_path)
+
+
+def _extract_range(bounds: tuple[int, int]) -> list[str]:
+    start, end = bounds
+    return [_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _iter_page_texts(pdf_path: str, workers: int | None):
+    reader = PyPDF2.PdfReader(pdf_path)
+    num_pages = len(reader.pages)
+    if num_pages < SERIAL_BELOW or workers == 1:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+    ranges = [(i, min(i + PAGES_PER_TASK, num_pages)) for i in range(0, num_pages, PAGES_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, len(ranges))
+    # spawn: forking a multi-threaded server process is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_open_worker, initargs=(pdf_path,)) as pool:
+        for texts in pool.map(_extract_range, ranges):
+            yield from texts
+
+
+def _temp_file(prefix: str, suffix: str) -> str:
+    # Unique per call: every Streamlit session is a thread of one process
+    fd, path = tempfile.mkstemp(prefix=prefix + ".", suffix=suffix, dir=CACHE_DIR)
+    os.close(fd)
+    return path
+
+
+def _cache_paths(digest: str) -> tuple[str, str]:
+    base = os.path.join(CACHE_DIR, digest)
+    return base + ".txt", base + ".json"
+
+
+def extract_pdf(data: bytes, name: str, output_dir: str | None = None, workers: int | None = None) -> Extraction:
+    """Extract a PDF's text to the cache and, if output_dir is given, to output_dir/<name>.txt."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+    text_path, info_path = _cache_paths(digest)
+    cached = os.path.exists(text_path) and os.path.exists(info_path)
+    if not cached:
+        pdf_path = _temp_file(digest, ".pdf")
+        tmp_path = _temp_file(digest, ".txt.tmp")
+        tmp_info_path = _temp_file(digest, ".json.tmp")
+        try:
+            with open(pdf_path, "wb") as f:
+                f.write(data)
+            info = {"pages": 0, "chars": 0}
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                for text in _iter_page_texts(pdf_path, workers):
+                    out.write(text)
+                    info["pages"] += 1
+                    info["chars"] += len(text)
+            with open(tmp_info_path, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+            # Concurrent extractions of one PDF write identical files; either may win
+            os.replace(tmp_path, text_path)
+            os.replace(tmp_info_path, info_path)
+        finally:
+            for leftover in (pdf_path, tmp_path, tmp_info_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+    with open(info_path, encoding="utf-8") as f:
+        info = json.load(f)
+    path = text_path
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, os.path.splitext(name)[0] + ".txt")
+        shutil.copyfile(text_path, path)
+    return Extraction(path, info["pages"], info["chars"], cached)
+
+
+def read_preview(extraction: Extraction, limit: int) -> str:
+    """The first limit characters of an extraction."""
+    with open(extraction.path, encoding="utf-8") as f:
+        return f.read(limit)
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ─── Query-embedding cache ────────────────────────────────────────────────────
+# Tier 1 is an in-process LRU; tier 2 is an optional SQLite file shared by all
+# processes on the host and kept across restarts. Keys are (model, normalized
+# query), so "Next", "next " and "NEXT" share one entry.
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int = 1024, path: str | None = None, max_disk_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL, PRIMARY KEY (model, query))"
+            )
+
+    def get(self, model: str, query: str) -> np.ndarray | None:
+        key = (model, normalize_query(query))
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND query = ?", key
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND query = ?",
+                        (time.time(), *key),
+                    )
+                    vector = np.frombuffer(row[0], dtype="float32")
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, model: str, query: str, vector: np.ndarray):
+        key = (model, normalize_query(query))
+        vector = np.asarray(vector, dtype="float32").ravel()
+        vector.flags.writeable = False
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                    (*key, vector.tobytes(), time.time()),
+                )
+                self._trim_disk()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _trim_disk(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            # Evict least recently used rows, plus some slack so this doesn't run on every put
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid IN"
+                " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess + self.max_disk_entries // 10,),
+            )
+            self.evictions += excess + self.max_disk_entries // 10
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._memory),
+            }
@@ -0,0 +1,71 @@
+import numpy as np
+
+from bm25 import terms
+from text_utils import count_tokens, split_sentences
+
+# ─── Local reranking and trimming ─────────────────────────────────────────────
+# Retrieval over-fetches candidates; they are reordered here with maximal
+# marginal relevance over their exact vectors, and every excerpt that makes
+# it into a prompt is cut down to the sentences sharing most terms with the
+# query. Nothing here calls the API.
+MMR_LAMBDA = 0.7  # 1.0 ranks by relevance alone, lower values favour diversity
+GAP = "…"  # marks sentences left out between two kept ones
+
+
+def cosine(query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Cosine similarity of the query vector with each row of vectors."""
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+    return vectors @ query / np.where(norms == 0, 1.0, norms)
+
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, lam: float = MMR_LAMBDA) -> list[int]:
+    """Row order by maximal marginal relevance: λ·relevance − (1 − λ)·max similarity to earlier rows."""
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = unit @ unit.T
+    redundancy = np.zeros(len(relevance))
+    remaining = list(range(len(relevance)))
+    order = []
+    while remaining:
+        scores = lam * relevance[remaining] - (1 - lam) * redundancy[remaining]
+        pick = remaining.pop(int(np.argmax(scores)))
+        order.append(pick)
+        redundancy = np.maximum(redundancy, similarity[pick])
+    return order
+
+
+def _cut(sentence: str, max_tokens: int) -> str:
+    # A sentence longer than the whole allowance keeps its first words
+    kept = sentence.split()
+    while len(kept) > 1 and count_tokens(" ".join(kept)) > max_tokens:
+        kept = kept[: len(kept) * 3 // 4]
+    text = " ".join(kept)
+    return text if count_tokens(text) <= max_tokens else text[: max_tokens * 4]
+
+
+def trim(text: str, query: str, max_tokens: int) -> str:
+    """The text's sentences sharing most query terms, in text order, within max_tokens.
+
+    Without any shared term the leading sentences are kept.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text.strip()
+    wanted = set(terms(query))
+    sentences = [s.strip() for _, s in split_sentences(text)]
+    overlap = [len(wanted & set(terms(s))) for s in sentences]
+    candidates = [i for i in range(len(sentences)) if overlap[i]] or list(range(len(sentences)))
+    candidates.sort(key=lambda i: (-overlap[i], i))
+    kept, used = [], 0
+    for i in candidates:
+        tokens = count_tokens(sentences[i]) + 1
+        if used + tokens <= max_tokens:
+            kept.append(i)
+            used += tokens
+    if not kept and candidates:
+        return _cut(sentences[candidates[0]], max_tokens)
+    kept.sort()
+    parts = []
+    for n, i in enumerate(kept):
+        if n and i != kept[n - 1] + 1:
+            parts.append(GAP)
+        parts.append(sentences[i])
+    return " ".join(parts)
@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+# ─── Process-wide resources ───────────────────────────────────────────────────
+# One OpenAI client per process, shared by every Streamlit session, so turns
+# reuse its pooled keep-alive connections; callers needing other timeouts
+# get views of it with with_options, which share the pool. The book library
+# is likewise loaded once per process by book_retrieval.
+# warm_up() loads everything a first question needs: the heavy imports
+# (openai, numpy, faiss), the library and its files in the page cache, and
+# the tokenizer. The apps start it on a background thread at their first
+# render (WARM_UP=0 disables), so the login page shows at once while the
+# library loads; `python resources.py` runs it in the foreground, e.g. before
+# `streamlit run`, to pre-load the page cache shared by the workers.
+WARM_UP = os.getenv("WARM_UP", "1") != "0"
+
+_client = None
+_client_lock = threading.Lock()
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def openai_client(**options):
+    """The process's OpenAI client; options (timeout, max_retries, ...) give a view sharing its connections."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client.with_options(**options) if options else _client
+
+
+def warm_up() -> dict:
+    """Load the resources of a first mentor turn; returns the seconds each part took."""
+    timings = {}
+
+    def part(name: str, load):
+        started = time.perf_counter()
+        try:
+            with metrics.span("warm_up", part=name):
+                load()
+        except Exception as err:  # a missing index must not stop the app; the first query reports it
+            logger.warning("Warm-up of %s failed: %s", name, str(err) or type(err).__name__)
+        timings[name] = time.perf_counter() - started
+
+    def imports():
+        import step_excerpts  # noqa: F401 (and book_retrieval, numpy, faiss, openai with it)
+
+    def library():
+        import book_retrieval
+
+        book_retrieval.warm_up()
+
+    def tokenizer():
+        from text_utils import count_tokens
+
+        count_tokens("warm up")
+
+    part("imports", imports)
+    part("openai_client", openai_client)
+    part("library", library)
+    part("tokenizer", tokenizer)
+    return timings
+
+
+def start_warm_up() -> threading.Thread | None:
+    """Run warm_up on a daemon thread, once per process; None when WARM_UP=0."""
+    global _warm_up_thread
+    if not WARM_UP:
+        return None
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+if __name__ == "__main__":
+    # python resources.py: load the library once so its files are in the page cache
+    for name, seconds in warm_up().items():
+        print(f"{name:<14} {seconds * 1000:>8.1f} ms")
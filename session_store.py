@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from glob import glob
+
+# ─── Session journal ──────────────────────────────────────────────────────────
+# One SQLite database (WAL mode) per CHAT_HISTORY_DIR. Every chat message is a
+# single appended row, so saving is O(1) per message and a crash loses at most
+# the message being written. Sessions also record the agenda step and state,
+# so a team can pick a meeting up again after a restart.
+DB_NAME = "sessions.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    team TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    meeting_type TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    step INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (team, session_id)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    team TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    kind TEXT,
+    step INTEGER,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (team, session_id, seq)
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class SessionStore:
+    """Thread-safe session journal; one instance is shared by every session in a process."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, DB_NAME)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def start_session(self, team: str, session_id: str, meeting_type: str, state: str = ""):
+        now = _now()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO sessions (team, session_id, meeting_type, created_at, updated_at, state)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (team, session_id, meeting_type or "", now, now, state),
+            )
+
+    def append_message(self, team: str, session_id: str, message: dict) -> int:
+        """Append one message; returns its sequence number within the session."""
+        now = _now()
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            (seq,) = self._db.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE team = ? AND session_id = ?",
+                (team, session_id),
+            ).fetchone()
+            self._db.execute(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (team, session_id, seq, message["role"], message["content"],
+                 message.get("kind"), message.get("step"), now),
+            )
+            self._db.execute(
+                "UPDATE sessions SET updated_at = ? WHERE team = ? AND session_id = ?",
+                (now, team, session_id),
+            )
+        return seq
+
+    def update_progress(self, team: str, session_id: str, step: int, state: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE sessions SET step = ?, state = ?, updated_at = ? WHERE team = ? AND session_id = ?",
+                (step, state, _now(), team, session_id),
+            )
+
+    def load_messages(self, team: str, session_id: str) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, kind, step FROM messages"
+                " WHERE team = ? AND session_id = ? ORDER BY seq",
+                (team, session_id),
+            ).fetchall()
+        messages = []
+        for row in rows:
+            message = {"role": row["role"], "content": row["content"]}
+            if row["kind"] is not None:
+                message["kind"] = row["kind"]
+            if row["step"] is not None:
+                message["step"] = row["step"]
+            messages.append(message)
+        return messages
+
+    def get_session(self, team: str, session_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM sessions WHERE team = ? AND session_id = ?", (team, session_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_sessions(self, team: str | None = None) -> list[dict]:
+        """Sessions (newest first) with their message counts, for one team or all."""
+        query = (
+            "SELECT s.*, (SELECT COUNT(*) FROM messages m"
+            "  WHERE m.team = s.team AND m.session_id = s.session_id) AS messages"
+            " FROM sessions s"
+        )
+        args = ()
+        if team is not None:
+            query += " WHERE s.team = ?"
+            args = (team,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY s.updated_at DESC", args).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_json_history(self, path: str) -> bool:
+        """Import one legacy {team}_{session_id}_history.json file; False if already present."""
+        name = os.path.basename(path)[: -len("_history.json")]
+        team, _, session_id = name.rpartition("_")
+        if not team or self.get_session(team, session_id):
+            return False
+        with open(path, encoding="utf-8") as f:
+            history = json.load(f)
+        self.start_session(team, session_id, "")
+        for message in history[1:]:  # [0] is the system prompt
+            self.append_message(team, session_id, message)
+        return True
+
+
+if __name__ == "__main__":
+    # python session_store.py [CHAT_HISTORY_DIR]: import legacy per-session JSON files
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.getenv(
+        "CHAT_HISTORY_DIR", os.path.join(os.getcwd(), "data", "faiss_index", "chat_history")
+    )
+    store = SessionStore(directory)
+    imported = sum(store.import_json_history(p) for p in glob(os.path.join(directory, "*_history.json")))
+    print(f"✅ Imported {imported} sessions into {store.path}")
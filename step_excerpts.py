@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+
+import agenda_engine
+from agenda_engine import Step
+from book_retrieval import RETRIEVAL_MODES, Excerpt, pack_excerpts, search_excerpts, served_version
+
+# ─── Precomputed agenda-step context ──────────────────────────────────────────
+# Agenda scripts are fixed, so the excerpts for each step's title and prompt
+# are retrieved once, offline, after every ingest:
+#   python step_excerpts.py
+# writes meeting_scripts/compiled/<meeting>.json. At a compiled step the app
+# only runs a local query on the team's message (STEP_LIVE_MODE, default
+# lexical) and blends it with the step's excerpts, so most turns never wait on
+# the embeddings API. Steps whose title or prompt changed since compiling are
+# ignored until the next compile, and so are whole scripts compiled against
+# another library version than the one served. Either way the excerpts are
+# trimmed to the team's message and packed into EXCERPT_TOKEN_BUDGET before
+# the prompt.
+SCRIPTS_DIR = "meeting_scripts"
+COMPILED_DIR = "compiled"
+STEP_TOP_K = 6
+STEP_LIVE_MODE = os.getenv("STEP_LIVE_MODE", "lexical")
+
+_compiled: dict[str, tuple[float, dict]] = {}  # path -> (mtime, contents)
+
+
+def step_key(item: Step) -> str:
+    """Fingerprint of an agenda step's text, to spot stale compiled context."""
+    return hashlib.sha256(f"{item.title}\n{item.prompt}".encode("utf8")).hexdigest()[:16]
+
+
+def compiled_path(meeting: str, scripts_dir: str = SCRIPTS_DIR) -> str:
+    return os.path.join(scripts_dir, COMPILED_DIR, f"{meeting}.json")
+
+
+def compile_script(meeting: str, scripts_dir: str = SCRIPTS_DIR, top_k: int = STEP_TOP_K, mode: str | None = None) -> int:
+    """Retrieve and store the top_k excerpts of every step of one agenda; returns the step count."""
+    agenda = agenda_engine.load(meeting, scripts_dir, (".json",))
+    if agenda is None:
+        raise FileNotFoundError(f"No meeting script {meeting}.json in {scripts_dir}")
+    # Concurrent searches share embeddings calls through book_retrieval's batcher
+    with ThreadPoolExecutor(max(1, len(agenda))) as pool:
+        results = pool.map(lambda item: search_excerpts(f"{item.title}\n{item.prompt}", top_k, mode), agenda)
+        steps = [
+            {"key": step_key(item), "excerpts": [asdict(e) for e in excerpts]}
+            for item, excerpts in zip(agenda, results)
+        ]
+    path = compiled_path(meeting, scripts_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": served_version(), "top_k": top_k, "steps": steps}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return len(steps)
+
+
+def _load(meeting: str, scripts_dir: str) -> dict | None:
+    path = compiled_path(meeting, scripts_dir)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _compiled.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            cached = _compiled[path] = (mtime, json.load(f))
+    return cached[1]
+
+
+def step_context(meeting: str, step: int, item: Step, scripts_dir: str = SCRIPTS_DIR) -> list[Excerpt]:
+    """The compiled excerpts of one agenda step; empty if not compiled or stale."""
+    compiled = _load(meeting, scripts_dir)
+    if compiled is None or step >= len(compiled["steps"]):
+        return []
+    # Excerpts of another build may come from removed books or be outranked now
+    if compiled.get("version") != served_version():
+        return []
+    entry = compiled["steps"][step]
+    if entry["key"] != step_key(item):
+        return []
+    return [Excerpt(**e) for e in entry["excerpts"]]
+
+
+def blend(live: list[Excerpt], context: list[Excerpt], top_k: int) -> list[Excerpt]:
+    """Alternate live and step excerpts (live first), without duplicates."""
+    results, seen = [], set()
+    for pair in zip(live + [None] * len(context), context + [None] * len(live)):
+        for excerpt in pair:
+            if excerpt is not None and (excerpt.book, excerpt.offset) not in seen:
+                seen.add((excerpt.book, excerpt.offset))
+                results.append(excerpt)
+    return results[:top_k]
+
+
+def excerpts_for_turn(
+    query: str,
+    meeting: str,
+    step: int,
+    item: Step | None,
+    top_k: int = 3,
+    scripts_dir: str = SCRIPTS_DIR,
+) -> list[Excerpt]:
+    """Excerpts for a team message: the step's compiled context refined by a live query, packed."""
+    context = step_context(meeting, step, item, scripts_dir) if item else []
+    if not context:
+        return pack_excerpts(search_excerpts(query, top_k), query)
+    return pack_excerpts(blend(search_excerpts(query, top_k, STEP_LIVE_MODE), context, top_k), query)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the book excerpts of every agenda step.")
+    parser.add_argument("meetings", nargs="*", help="Meeting names (default: every script)")
+    parser.add_argument("--scripts-dir", default=SCRIPTS_DIR)
+    parser.add_argument("--top-k", type=int, default=STEP_TOP_K, help="Excerpts stored per step")
+    parser.add_argument("--mode", choices=RETRIEVAL_MODES, help="Retrieval mode (default: RETRIEVAL_MODE)")
+    args = parser.parse_args(argv)
+
+    meetings = args.meetings or agenda_engine.list_scripts(args.scripts_dir, (".json",))
+    for meeting in meetings:
+        steps = compile_script(meeting, args.scripts_dir, args.top_k, args.mode)
+        print(f"✅ Compiled {steps} steps of {meeting}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ.setdefault("METRICS_LOG", "")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+import ann_index  # noqa: E402
+import ingest_books  # noqa: E402
+from fake_openai import FakeOpenAI, FakeOpenAIServer  # noqa: E402
+
+
+def test_ivfpq_rejects_scalar_storage():
+    vectors = np.random.default_rng(0).standard_normal((64, 32)).astype("float32")
+    with pytest.raises(ValueError, match="ivfpq stores PQ codes"):
+        ann_index.build_index("ivfpq", vectors, np.arange(64), storage="sq8")
+
+
+def test_ivfpq_with_scalar_storage_fails_before_embedding(tmp_path, capsys):
+    books, out = tmp_path / "books", tmp_path / "index"
+    books.mkdir()
+    (books / "Book A.txt").write_text("Chapter 1\n\nSome text about customers and pricing.\n", encoding="utf-8")
+    with FakeOpenAIServer(FakeOpenAI(dim=32)) as server:
+        with pytest.raises(SystemExit):
+            ingest_books.main([
+                "--books-dir", str(books), "--out-dir", str(out), "--base-url", server.base_url,
+                "--index-type", "ivfpq", "--storage", "sq8",
+            ])
+        assert server.fake.requests["embeddings"] == 0
+
+    assert "ivfpq stores PQ codes" in capsys.readouterr().err
+    assert not out.exists()
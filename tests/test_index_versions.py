@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index_versions  # noqa: E402
+
+
+def _publish(root: str, version: str):
+    staging = os.path.join(root, index_versions.VERSIONS_DIR, f".{version}.staging")
+    os.makedirs(staging)
+    index_versions.publish(root, version, staging)
+
+
+def test_prune_keeps_newest_versions_and_removes_leftover_staging(tmp_path):
+    root = str(tmp_path)
+    for version in ("20260101T000000", "20260102T000000", "20260103T000000"):
+        _publish(root, version)
+    _, leftover = index_versions.stage(root)
+
+    removed = index_versions.prune(root, keep=2)
+
+    assert removed == ["20260101T000000"]
+    assert sorted(os.listdir(os.path.join(root, index_versions.VERSIONS_DIR))) == ["20260102T000000", "20260103T000000"]
+    assert not os.path.exists(leftover)
+    assert index_versions.resolve(root) == ("20260103T000000", os.path.join(root, "versions", "20260103T000000"))
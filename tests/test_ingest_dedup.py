@@ -0,0 +1,82 @@
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ.setdefault("METRICS_LOG", "")
+
+import pytest  # noqa: E402
+
+import index_versions  # noqa: E402
+import ingest_books  # noqa: E402
+from chunk_store import ChunkStore  # noqa: E402
+from fake_openai import FakeOpenAI, FakeOpenAIServer  # noqa: E402
+
+
+def _write_book(path: str, seed: int, sentences: int = 120):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("aeioubcdfghklmnprstvz") for _ in range(rng.randint(3, 9))) for _ in range(2000)]
+    lines = ["Chapter 1", ""]
+    for _ in range(sentences // 4):
+        paragraph = [" ".join(rng.choices(vocabulary, k=rng.randint(8, 20))).capitalize() + "." for _ in range(4)]
+        lines += [" ".join(paragraph), ""]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+@pytest.fixture
+def server():
+    with FakeOpenAIServer(FakeOpenAI(dim=32)) as running:
+        yield running
+
+
+def _ingest(books: str, out: str, server, capsys) -> str:
+    ingest_books.main(["--books-dir", books, "--out-dir", out, "--base-url", server.base_url, "--workers", "1"])
+    return capsys.readouterr().out
+
+
+def _texts(out: str) -> list[str]:
+    store = ChunkStore(index_versions.resolve(out)[1])
+    try:
+        return [store.text(i) for i in store.ids().tolist()]
+    finally:
+        store.close()
+
+
+def test_edited_book_is_not_merged_into_its_old_chunks(tmp_path, server, capsys):
+    books, out = str(tmp_path / "books"), str(tmp_path / "index")
+    os.makedirs(books)
+    _write_book(os.path.join(books, "Book A.txt"), seed=1)
+    _write_book(os.path.join(books, "Book B.txt"), seed=2)
+    _ingest(books, out, server, capsys)
+
+    path = os.path.join(books, "Book A.txt")
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    first = text.split("\n")[2].split()[0]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace(first, "Corrected", 1))
+    output = _ingest(books, out, server, capsys)
+
+    assert "Merged" not in output
+    assert any("Corrected" in t for t in _texts(out))
+
+
+def test_edited_copy_of_unchanged_book_is_merged(tmp_path, server, capsys):
+    books, out = str(tmp_path / "books"), str(tmp_path / "index")
+    os.makedirs(books)
+    _write_book(os.path.join(books, "Book A.txt"), seed=1)
+    _ingest(books, out, server, capsys)
+    chunks = len(_texts(out))
+
+    with open(os.path.join(books, "Book A.txt"), encoding="utf-8") as f:
+        text = f.read()
+    first = text.split("\n")[2].split()[0]
+    with open(os.path.join(books, "Book A (2nd edition).txt"), "w", encoding="utf-8") as f:
+        f.write(text.replace(first, "Corrected", 1))
+    output = _ingest(books, out, server, capsys)
+
+    assert "Merged 1 near-duplicate" in output
+    assert len(_texts(out)) == chunks
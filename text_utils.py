@@ -0,0 +1,48 @@
+import functools
+import re
+
+# tiktoken gives exact counts for OpenAI models; without it we fall back to the
+# usual ~4 characters per token estimate, which is close enough for budgeting.
+# The encoding is loaded on first use, not at import.
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+")
+_WORD = re.compile(r"[a-z0-9]+(?:['’][a-z]+)?")
+
+
+@functools.cache
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # not installed, or the encoding can't be downloaded
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (exact with tiktoken, estimated otherwise)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, (len(text) + 3) // 4)
+
+
+def split_sentences(text: str) -> list[tuple[int, str]]:
+    """Split text into (offset, sentence) pairs; offsets are positions in text."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        sentence = text[start : match.end()]
+        if sentence.strip():
+            sentences.append((start, sentence))
+        start = match.end()
+    if text[start:].strip():
+        sentences.append((start, text[start:]))
+    return sentences
+
+
+def words(text: str) -> list[str]:
+    """Lower-cased word tokens, for lexical matching."""
+    return _WORD.findall(text.lower())